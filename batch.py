@@ -0,0 +1,136 @@
+import argparse
+import json
+import sys
+import time
+
+import cache
+import expressions
+import main
+
+#####################################################
+##              Batch Linkage Synthesis            ##
+#####################################################
+# Solves many linkages without printing or plotting. Each job is a dictionary using the same
+# names as the Solver arguments (angles in radians), plus an optional "id" copied to its result:
+#   {"id": 1, "func": "log(x)/log(10)", "x_min": 1, "x_max": 2, "theta2_start": 1.0,
+#    "theta2_max_rot": 1.2, "theta4_start": 4.0, "theta4_max_rot": 1.0, "do_optimise": true}
+# A job can give "table", the path of a file of measured (x, y) values, in place of "func"
+
+# Job keys passed to the Solver constructor, jobs use the grid sweep unless they ask otherwise
+SOLVER_ARGUMENTS = ("func", "x_min", "x_max", "theta2_start", "theta2_max_rot", "theta4_start", "theta4_max_rot",
+                    "do_optimise", "engine", "sweep", "sweep_step", "workers", "precision_points")
+
+# Job keys set as Solver attributes after it is constructed
+SOLVER_OPTIONS = ("minimum_range", "ensure_linkage_validity", "objective", "error_weight", "error_samples",
+                  "time_budget", "evaluation_budget", "target_score", "checkpoint", "tile_rows", "mechanism_types",
+                  "full_range_assembly", "min_transmission_angle")
+
+
+# Builds a silent Solver for a job, raising ValueError for keys it does not understand
+# result_cache is an optional cache.ResultCache shared by every job
+def build_solver(spec, result_cache=None) -> main.Solver:
+    unknown = set(spec) - set(SOLVER_ARGUMENTS) - set(SOLVER_OPTIONS) - {"id", "table"}
+    if unknown:
+        raise ValueError("unknown job keys: %s" % ", ".join(sorted(unknown)))
+    if "func" in spec and "table" in spec:
+        raise ValueError("a job can give either func or table, not both")
+
+    arguments = {"sweep": "grid"}
+    arguments.update((key, spec[key]) for key in SOLVER_ARGUMENTS if key in spec)
+    if "table" in spec:
+        arguments["func"] = expressions.load_table(spec["table"])
+    solver = main.Solver(is_silent=True, cache=result_cache, **arguments)
+
+    for key in SOLVER_OPTIONS:
+        if key in spec:
+            setattr(solver, key, spec[key])
+    return solver
+
+
+# Solves a single job and returns its result, a job that fails returns its error instead of raising
+# A job that could not be read is passed in as the exception explaining why
+def solve_job(spec, result_cache=None) -> dict:
+    if isinstance(spec, Exception):
+        return {"id": None, "error": "%s: %s" % (type(spec).__name__, spec), "seconds": 0.0}
+
+    result = {"id": spec.get("id")}
+    start = time.perf_counter()
+
+    try:
+        solver = build_solver(spec, result_cache)
+        lengths = solver.find_optimal_linkage()
+    except Exception as error:
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+    else:
+        result["found"] = any(lengths)
+        result["lengths"] = [float(length) for length in lengths]
+        result["range"] = max(result["lengths"]) - min(result["lengths"])
+        result["theta2_start"] = solver.theta2_start
+        result["theta4_start"] = solver.theta4_start
+        result["cached"] = solver.from_cache
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+# Solves every job in turn, yielding each result as soon as it is ready
+# specs can be any iterable (including a generator), so arbitrarily many jobs use bounded memory
+def solve_many(specs, result_cache=None):
+    for spec in specs:
+        yield solve_job(spec, result_cache)
+
+
+# Reads jobs one line at a time from a JSONL file, skipping blank lines
+# Lines that are not a JSON object are yielded as a ValueError so only that job fails
+def read_jobs(file):
+    for line_number, line in enumerate(file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            spec = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield ValueError("line %d is not valid JSON (%s)" % (line_number, error))
+            continue
+        if not isinstance(spec, dict):
+            yield ValueError("line %d is not a JSON object" % line_number)
+            continue
+        yield spec
+
+
+# Writes each result as one JSONL line, flushing so partial output survives an interrupted run
+def write_results(results, file) -> int:
+    count = 0
+    for result in results:
+        file.write(json.dumps(result) + "\n")
+        file.flush()
+        count += 1
+    return count
+
+
+def run(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Synthesise a four bar linkage for every job in a JSONL file.")
+    parser.add_argument("jobs", help="JSONL file of job specs, or - for stdin")
+    parser.add_argument("results", nargs="?", default="-", help="JSONL file to write results to, or - for stdout")
+    parser.add_argument("--cache", help="SQLite file caching results between runs")
+    parser.add_argument("--cache-size", type=int, default=10000, help="most results kept in the cache")
+    args = parser.parse_args(argv)
+
+    result_cache = cache.ResultCache(args.cache, args.cache_size) if args.cache else None
+
+    jobs_file = sys.stdin if args.jobs == "-" else open(args.jobs)
+    results_file = sys.stdout if args.results == "-" else open(args.results, "w")
+    try:
+        write_results(solve_many(read_jobs(jobs_file), result_cache), results_file)
+    finally:
+        if result_cache is not None:
+            result_cache.close()
+        if jobs_file is not sys.stdin:
+            jobs_file.close()
+        if results_file is not sys.stdout:
+            results_file.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
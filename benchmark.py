@@ -0,0 +1,178 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import main
+import plotter
+
+#####################################################
+##                 Benchmark Suite                 ##
+#####################################################
+# Times the synthesis and plotting pipeline on a fixed set of design problems, writes the timings
+# as JSON and optionally compares them against a previous run to catch regressions:
+#   python benchmark.py --output bench.json
+#   python benchmark.py --baseline bench.json
+
+# Canonical design problems, as Solver arguments (angles in radians)
+PROBLEMS = {
+    # The example in main.py
+    "sine": dict(func="sin(x)", x_min=math.pi/4, x_max=3*math.pi/4,
+                 theta2_start=7*math.pi/12, theta2_max_rot=2*math.pi/3,
+                 theta4_start=4*math.pi/3, theta4_max_rot=math.pi/3),
+    # The example run by ksynpy.frst
+    "log10": dict(func="log(x)/log(10)", x_min=1, x_max=2,
+                  theta2_start=math.radians(100), theta2_max_rot=math.radians(120),
+                  theta4_start=math.radians(240), theta4_max_rot=math.radians(60)),
+    "quadratic": dict(func="x**2", x_min=0.5, x_max=2,
+                      theta2_start=0.3, theta2_max_rot=1.5, theta4_start=2, theta4_max_rot=1.4),
+    "cubic": dict(func="x**3 - x", x_min=1, x_max=2,
+                  theta2_start=1, theta2_max_rot=1.6, theta4_start=3, theta4_max_rot=1.2),
+    "exponential": dict(func="exp(x)", x_min=0, x_max=1,
+                        theta2_start=0.5, theta2_max_rot=1.9, theta4_start=3, theta4_max_rot=1.2),
+}
+
+# (sweep, step in degrees) pairs the synthesis is timed with
+SWEEPS = [("loop", 5), ("grid", 5), ("grid", 1), ("grid", 0.25), ("adaptive", 5)]
+
+# Number of input angles Plotter.generate_points is timed with
+RESOLUTIONS = [1000, 100000]
+
+# Modules whose cold start (a fresh interpreter importing them) is timed
+STARTUP_MODULES = ["main", "batch", "ksynpy"]
+
+
+# Runs func repeats times, returning the median and fastest wall time in seconds
+def time_call(func, repeats) -> dict:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "repeats": repeats}
+
+
+def synthesis_benchmark(problem, sweep, step, optimise):
+    def run():
+        solver = main.Solver(**PROBLEMS[problem], do_optimise=optimise, sweep=sweep, sweep_step=step)
+        solver.minimum_range = 0 if optimise else solver.minimum_range
+        with contextlib.redirect_stdout(io.StringIO()):
+            solver.execute_4bar_calculations()
+    return run
+
+
+# Starts a fresh interpreter that only imports the module, as a short CLI job or a new worker process would
+# The time includes starting python itself, so compare it against the "python" entry
+def startup_benchmark(module):
+    command = [sys.executable, "-c", "import %s" % module if module else "pass"]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return lambda: subprocess.run(command, cwd=directory, check=True)
+
+
+# Linkage used by the plotting benchmarks, found once by an adaptive sweep of the problem
+def benchmark_plotter(problem, **kwargs) -> plotter.Plotter:
+    solver = main.Solver(**PROBLEMS[problem], do_optimise=True, sweep="adaptive")
+    solver.minimum_range = 0
+    lengths = solver.find_optimal_linkage()
+    return plotter.Plotter(*lengths, solver.theta2_start, solver.theta2_max_rot,
+                           solver.theta4_start, solver.theta4_max_rot,
+                           solver.x_points[0], solver.x_points[1], **kwargs)
+
+
+# Runs every benchmark, returning a dictionary of timings keyed by benchmark name
+def run_benchmarks(repeats=3, problems=None, animation=True) -> dict:
+    results = {"startup/python": time_call(startup_benchmark(None), repeats)}
+    for module in STARTUP_MODULES:
+        results["startup/%s" % module] = time_call(startup_benchmark(module), repeats)
+
+    for problem in problems or PROBLEMS:
+        for sweep, step in SWEEPS:
+            for optimise in (False, True):
+                if sweep == "adaptive" and not optimise:
+                    continue
+                name = "synthesis/%s/%s-%g/%s" % (problem, sweep, step, "optimise" if optimise else "first")
+                # the loop sweep is much slower, so it is only timed once
+                results[name] = time_call(synthesis_benchmark(problem, sweep, step, optimise),
+                                          1 if sweep == "loop" else repeats)
+
+    problem = "log10" if problems is None or "log10" in problems else next(iter(problems))
+    for resolution in RESOLUTIONS:
+        plot = benchmark_plotter(problem, resolution=resolution)
+        results["plotter/generate_points/%d" % resolution] = time_call(plot.generate_points, repeats)
+
+    plot = benchmark_plotter(problem)
+    plot.generate_points()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "plot.gif")
+        results["plotter/export_animation"] = time_call(lambda: plot.export_animation(path), repeats)
+        if animation:
+            results["plotter/animate_linkage"] = time_call(lambda: plot.animate_linkage(path), 1)
+    return results
+
+
+# Versions and machine the benchmarks ran on
+def environment() -> dict:
+    import sympy
+    return {"python": platform.python_version(), "numpy": np.__version__, "sympy": sympy.__version__,
+            "machine": platform.machine(), "processor": platform.processor(), "system": platform.system(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+# Compares median times against a baseline, returning the benchmarks slower by more than tolerance
+# tolerance is a fraction, so 0.2 allows a benchmark to be 20% slower than the baseline
+def compare(results, baseline, tolerance=0.2) -> dict:
+    regressions = {}
+    for name, timing in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median"], timing["median"]
+        if after > before * (1 + tolerance):
+            regressions[name] = {"baseline": before, "current": after, "ratio": after / before}
+    return regressions
+
+
+def run(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time the linkage synthesis and plotting pipeline.")
+    parser.add_argument("--output", help="file to write the timings to as JSON, printed if not given")
+    parser.add_argument("--baseline", help="JSON file from a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="fraction slower than the baseline allowed")
+    parser.add_argument("--repeats", type=int, default=3, help="times each benchmark is repeated")
+    parser.add_argument("--problems", nargs="+", choices=sorted(PROBLEMS), help="only run these problems")
+    parser.add_argument("--skip-animation", action="store_true", help="do not time the matplotlib animation")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment(),
+              "results": run_benchmarks(args.repeats, args.problems, not args.skip_animation)}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        report["regressions"] = compare(report["results"], baseline, args.tolerance)
+        for name, regression in report["regressions"].items():
+            print("Regression in %s: %.4fs -> %.4fs (%.2fx)" % (name, regression["baseline"],
+                                                                regression["current"], regression["ratio"]),
+                  file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(run())
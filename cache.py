@@ -0,0 +1,91 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+#####################################################
+##            Persistent Result Cache              ##
+#####################################################
+
+# Increase whenever a change to the synthesis would give different results for the same inputs,
+# entries stored by any other version are discarded when the cache is opened
+CACHE_VERSION = 4
+
+# Solver inputs that decide which linkage a synthesis finds
+KEY_FIELDS = ("x_min", "x_max", "theta2_start", "theta2_max_rot", "theta4_start", "theta4_max_rot",
+              "sweep", "sweep_step", "optimise_results", "minimum_range", "ensure_linkage_validity",
+              "precision_points", "objective", "error_weight", "error_samples", "mechanism_types",
+              "full_range_assembly", "min_transmission_angle")
+
+# Further inputs that decide the linkage an adaptive sweep finds, only part of the key for adaptive solvers
+ADAPTIVE_KEY_FIELDS = ("adaptive_coarse_step", "adaptive_refine_cells", "adaptive_refine_factor",
+                       "adaptive_precision", "adaptive_polish")
+
+
+# Stores the linkage found for each distinct design in an SQLite file, so repeated requests skip the sweep
+# Least recently used entries are evicted once there are more than max_entries
+class ResultCache:
+    def __init__(self, path, max_entries=10000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                                "key TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                                "value TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.connection.execute("DELETE FROM results WHERE version != ?", (CACHE_VERSION,))
+        self.connection.commit()
+        pass
+
+    # Canonical hash of a solver's normalised target function and the inputs listed in KEY_FIELDS,
+    # along with ADAPTIVE_KEY_FIELDS for an adaptive sweep
+    @staticmethod
+    def key_for(solver) -> str:
+        fields = KEY_FIELDS + (ADAPTIVE_KEY_FIELDS if solver.sweep == "adaptive" else ())
+        inputs = {field: getattr(solver, field) for field in fields}
+        inputs["func"] = solver.func.canonical()
+        inputs["version"] = CACHE_VERSION
+        text = json.dumps(inputs, sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    # Returns the stored result for a key, or None if there is none
+    def get(self, key):
+        row = self.connection.execute("SELECT value FROM results WHERE key = ? AND version = ?",
+                                      (key, CACHE_VERSION)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.connection.commit()
+        return json.loads(row[0])
+
+    # Stores a result, then evicts the least recently used entries beyond max_entries
+    def put(self, key, value) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO results (key, version, value, last_used) VALUES (?, ?, ?, ?)",
+                                (key, CACHE_VERSION, json.dumps(value), time.time()))
+        self.connection.execute("DELETE FROM results WHERE key IN ("
+                                "SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                                (self.max_entries,))
+        self.connection.commit()
+        pass
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    # Hit and miss counts since the cache was opened, and the number of entries stored
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self), "version": CACHE_VERSION}
+
+    def clear(self) -> None:
+        self.connection.execute("DELETE FROM results")
+        self.connection.commit()
+        pass
+
+    def close(self) -> None:
+        self.connection.close()
+        pass
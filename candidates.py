@@ -0,0 +1,151 @@
+import os
+
+import numpy as np
+
+import kinematics
+
+#####################################################
+##                 Candidate Store                 ##
+#####################################################
+# Every candidate linkage a numeric sweep evaluated, kept as one row of a structured numpy array
+# so the whole set can be queried afterwards without sweeping again, for example
+#   solver = main.Solver(..., sweep="grid", keep_candidates=True)
+#   solver.find_optimal_linkage()
+#   solver.candidates.feasible().filter(lambda c: c["r2"] < 0.5).top(5, "range")
+#   solver.candidates.filter(lambda c: c["mechanism"] == kinematics.MECHANISM_TYPES.index("crank-rocker"))
+
+# One candidate: its start angles, K values, link lengths, the range of its lengths, the score
+# optimisation minimises (the range unless Solver.objective says otherwise), whether its lengths
+# are all non-negative, whether it assembles at its starting angle, whether it is within the limits on
+# the kind of linkage set on the Solver, and its mechanism type (an index into kinematics.MECHANISM_TYPES)
+CANDIDATE_DTYPE = np.dtype([("theta2_start", "f8"), ("theta4_start", "f8"),
+                            ("k1", "f8"), ("k2", "f8"), ("k3", "f8"),
+                            ("r1", "f8"), ("r2", "f8"), ("r3", "f8"), ("r4", "f8"),
+                            ("range", "f8"), ("score", "f8"),
+                            ("non_negative", "?"), ("assembles", "?"), ("within_limits", "?"),
+                            ("mechanism", "i1")])
+
+
+# Structured array of candidates with helpers to query it. Stores are built by appending blocks of
+# candidates as a sweep evaluates them, either in memory or, given a path and the number of
+# candidates expected, straight into a memory-mapped .npy file
+class CandidateStore:
+    def __init__(self, data=None, path=None, capacity=None) -> None:
+        self.path = path
+        self.count = 0
+        self._chunks = []
+
+        if data is not None:
+            self.data = data
+            self.count = len(data)
+        elif path is not None and capacity is not None:
+            self.data = np.lib.format.open_memmap(path, mode="w+", dtype=CANDIDATE_DTYPE, shape=(capacity,))
+        else:
+            self.data = np.empty(0, dtype=CANDIDATE_DTYPE)
+        pass
+
+    # Adds a block of candidates, every argument broadcasting against the leading axes of lengths
+    def append(self, theta2_starts, theta4_starts, k_vals, lengths, non_negative, assembles, scores,
+               within_limits=True) -> None:
+        lengths = np.asarray(lengths, dtype=float)
+        shape = lengths.shape[:-1]
+        k_vals = np.asarray(k_vals, dtype=float)
+
+        block = np.empty(int(np.prod(shape)), dtype=CANDIDATE_DTYPE)
+        block["theta2_start"] = np.broadcast_to(theta2_starts, shape).ravel()
+        block["theta4_start"] = np.broadcast_to(theta4_starts, shape).ravel()
+        for i in range(3):
+            block["k%d" % (i + 1)] = np.broadcast_to(k_vals[..., i], shape).ravel()
+        for i in range(4):
+            block["r%d" % (i + 1)] = lengths[..., i].ravel()
+        block["range"] = (np.max(lengths, axis=-1) - np.min(lengths, axis=-1)).ravel()
+        block["score"] = np.broadcast_to(scores, shape).ravel()
+        block["non_negative"] = np.broadcast_to(non_negative, shape).ravel()
+        block["assembles"] = np.broadcast_to(assembles, shape).ravel()
+        block["within_limits"] = np.broadcast_to(within_limits, shape).ravel()
+        block["mechanism"] = kinematics.mechanism_types(*np.moveaxis(lengths, -1, 0)).ravel()
+
+        if isinstance(self.data, np.memmap):
+            self.data[self.count:self.count + len(block)] = block
+        else:
+            self._chunks.append(block)
+        self.count += len(block)
+        pass
+
+    # Called once nothing more will be appended. Joins the blocks appended in memory, writing them to
+    # path if there is one, and trims a memory-mapped store to the candidates actually appended
+    def finish(self) -> None:
+        if isinstance(self.data, np.memmap):
+            self.data.flush()
+            if self.count < len(self.data):
+                save_atomic(self.path, self.data[:self.count])
+                self.data = np.load(self.path, mmap_mode="r+")
+        elif self._chunks:
+            self.data = np.concatenate([self.data] + self._chunks)
+            self._chunks = []
+            if self.path is not None:
+                save_atomic(self.path, self.data)
+                self.data = np.load(self.path, mmap_mode="r+")
+        pass
+
+    def __len__(self) -> int:
+        return self.count
+
+    # A field name gives that column, anything else indexes the rows
+    def __getitem__(self, item):
+        return self.data[:self.count][item]
+
+    # Candidates where mask is True, mask being a boolean array or a function of the data returning one
+    def filter(self, mask) -> "CandidateStore":
+        data = self.data[:self.count]
+        if callable(mask):
+            mask = mask(data)
+        return CandidateStore(data[np.asarray(mask, dtype=bool)])
+
+    # Candidates that passed every check the sweep makes
+    def feasible(self) -> "CandidateStore":
+        return self.filter(lambda data: data["non_negative"] & data["assembles"] & data["within_limits"]
+                           & ~np.isnan(data["range"]))
+
+    # Candidates ordered by a field, in the order evaluated for ties
+    def sort(self, field="score", descending=False) -> "CandidateStore":
+        data = self.data[:self.count]
+        values = -data[field] if descending else data[field]
+        return CandidateStore(data[np.argsort(values, kind="stable")])
+
+    # The k candidates with the smallest (or largest) values of a field, in order, ignoring nan
+    def top(self, k, field="score", descending=False) -> "CandidateStore":
+        data = self.data[:self.count]
+        data = data[~np.isnan(data[field])]
+        values = -data[field] if descending else data[field]
+        if k < len(data):
+            nearest = np.sort(np.argpartition(values, k - 1)[:k])
+            data, values = data[nearest], values[nearest]
+        return CandidateStore(data[np.argsort(values, kind="stable")])
+
+    # Writes the candidates to a .npz (compressed) or .npy file, chosen by the extension
+    def save(self, path) -> None:
+        data = self.data[:self.count]
+        if path.endswith(".npz"):
+            np.savez_compressed(path, candidates=data)
+        else:
+            np.save(path, data)
+        pass
+
+    # Reads a store written by save, .npy files are memory-mapped unless mmap is False
+    @classmethod
+    def load(cls, path, mmap=True) -> "CandidateStore":
+        if path.endswith(".npz"):
+            with np.load(path) as archive:
+                return cls(archive["candidates"])
+        return cls(np.load(path, mmap_mode="r" if mmap else None), path=path)
+
+
+# Saves an array as .npy by writing a temporary file and moving it into place, so the file at path is
+# never left half written, and a memory map of the old file can be read while the new one is written
+def save_atomic(path, data) -> None:
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        np.save(file, data)
+    os.replace(temporary, path)
+    pass
@@ -0,0 +1,511 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+import kinematics
+
+#####################################################
+##              Numeric Synthesis Engine           ##
+#####################################################
+# Pure floating point replacements for the symbolic steps in main.Solver.
+# Every function accepts either single values or arrays of candidates, the
+# precision points always live on the last axis.
+
+# Maximum difference allowed between the numeric and sympy engines
+ENGINE_TOLERANCE = 1e-9
+
+# Determinants smaller than this are treated as a singular Freudenstein system
+SINGULAR_TOLERANCE = 1e-12
+
+# Number of candidates a sweep evaluates at once, bounding its memory use
+GRID_BLOCK_SIZE = 2**18
+
+# Set in the worker processes of a parallel sweep, holds the earliest row any of them stopped on
+_stop_row = None
+
+
+# Straight line through (lower, angle1) and (upper, angle2), returned as its slope and intercept
+# Equal bounds cannot be mapped and give nan
+def linear_map(lower, upper, angle1, angle2):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.float64(angle2 - angle1) / np.float64(upper - lower)
+    return float(slope), float(angle1 - slope*lower)
+
+
+# Solves K1*cos(theta2) + K2*cos(theta4) + K3 = cos(theta2 - theta4) at the precision points
+# With 3 points the system is solved exactly, with more K1 to K3 are fitted by least squares
+# Uses Cramer's rule so a whole grid of candidates is solved at once, singular systems return nan
+def solve_freudenstein(theta2_vals, theta4_vals):
+    theta2_vals = np.asarray(theta2_vals, dtype=float)
+    theta4_vals = np.asarray(theta4_vals, dtype=float)
+
+    if theta2_vals.shape[-1] < 3:
+        raise ValueError("at least 3 precision points are needed, not %d" % theta2_vals.shape[-1])
+    if theta2_vals.shape[-1] > 3:
+        return fit_freudenstein(theta2_vals, theta4_vals)
+
+    a = np.cos(theta2_vals)
+    b = np.cos(theta4_vals)
+    r = np.cos(theta2_vals - theta4_vals)
+
+    a1, a2, a3 = a[..., 0], a[..., 1], a[..., 2]
+    b1, b2, b3 = b[..., 0], b[..., 1], b[..., 2]
+    r1, r2, r3 = r[..., 0], r[..., 1], r[..., 2]
+
+    # Rows of the system are [a_i, b_i, 1], expanding every determinant along the column of ones
+    det = (a2*b3 - a3*b2) - (a1*b3 - a3*b1) + (a1*b2 - a2*b1)
+    det_k1 = (r2*b3 - r3*b2) - (r1*b3 - r3*b1) + (r1*b2 - r2*b1)
+    det_k2 = (a2*r3 - a3*r2) - (a1*r3 - a3*r1) + (a1*r2 - a2*r1)
+    det_k3 = a1*(b2*r3 - b3*r2) - b1*(a2*r3 - a3*r2) + r1*(a2*b3 - a3*b2)
+
+    singular = np.abs(det) <= SINGULAR_TOLERANCE
+    safe_det = np.where(singular, 1.0, det)
+
+    k_vals = np.stack((det_k1 / safe_det, det_k2 / safe_det, det_k3 / safe_det), axis=-1)
+    k_vals[singular] = np.nan
+    return k_vals
+
+
+# Least squares fit of K1 to K3 over any number of precision points, for every candidate at once
+# Builds the 3x3 normal equations of each candidate and solves them all with Cramer's rule
+def fit_freudenstein(theta2_vals, theta4_vals):
+    theta2_vals = np.asarray(theta2_vals, dtype=float)
+    theta4_vals = np.asarray(theta4_vals, dtype=float)
+
+    rows = np.stack((np.cos(theta2_vals), np.cos(theta4_vals), np.ones_like(theta2_vals)), axis=-1)
+    r = np.cos(theta2_vals - theta4_vals)
+    normal = np.einsum('...pi,...pj->...ij', rows, rows)
+    rhs = np.einsum('...pi,...p->...i', rows, r)
+    return _solve_normal_equations(normal, rhs, theta2_vals.shape[-1])
+
+
+# fit_freudenstein for a grid where every row of theta2 angles is paired with every row of theta4 angles
+# theta2_rows is (n, points) and theta4_rows is (m, points), giving (n, m, 3) K values
+# The sums in the normal equations separate into matrix products, so the cost barely grows with the points
+def fit_freudenstein_grid(theta2_rows, theta4_rows):
+    cos2, sin2 = np.cos(theta2_rows), np.sin(theta2_rows)
+    cos4, sin4 = np.cos(theta4_rows), np.sin(theta4_rows)
+    points = theta2_rows.shape[-1]
+    shape = (len(theta2_rows), len(theta4_rows))
+
+    # cos(theta2 - theta4) = cos2*cos4 + sin2*sin4
+    s_ab = cos2 @ cos4.T
+    s_r = s_ab + sin2 @ sin4.T
+    s_ar = (cos2 * cos2) @ cos4.T + (cos2 * sin2) @ sin4.T
+    s_br = cos2 @ (cos4 * cos4).T + sin2 @ (cos4 * sin4).T
+    s_aa = np.broadcast_to(np.sum(cos2 * cos2, axis=-1)[:, None], shape)
+    s_a = np.broadcast_to(np.sum(cos2, axis=-1)[:, None], shape)
+    s_bb = np.broadcast_to(np.sum(cos4 * cos4, axis=-1)[None, :], shape)
+    s_b = np.broadcast_to(np.sum(cos4, axis=-1)[None, :], shape)
+    count = np.full(shape, float(points))
+
+    normal = np.stack((np.stack((s_aa, s_ab, s_a), axis=-1),
+                       np.stack((s_ab, s_bb, s_b), axis=-1),
+                       np.stack((s_a, s_b, count), axis=-1)), axis=-2)
+    rhs = np.stack((s_ar, s_br, s_r), axis=-1)
+    return _solve_normal_equations(normal, rhs, points)
+
+
+# Solves stacks of symmetric 3x3 normal equations with Cramer's rule, singular ones give nan
+def _solve_normal_equations(normal, rhs, points):
+    det = _det3(normal)
+    # the normal matrix grows with the number of points, so compare against its scale
+    singular = np.abs(det) <= SINGULAR_TOLERANCE * points**3
+    safe_det = np.where(singular, 1.0, det)
+
+    k_vals = np.empty(rhs.shape)
+    for column in range(3):
+        replaced = normal.copy()
+        replaced[..., :, column] = rhs
+        k_vals[..., column] = _det3(replaced) / safe_det
+    k_vals[singular] = np.nan
+    return k_vals
+
+
+def _det3(m):
+    return (m[..., 0, 0] * (m[..., 1, 1]*m[..., 2, 2] - m[..., 1, 2]*m[..., 2, 1])
+            - m[..., 0, 1] * (m[..., 1, 0]*m[..., 2, 2] - m[..., 1, 2]*m[..., 2, 0])
+            + m[..., 0, 2] * (m[..., 1, 0]*m[..., 2, 1] - m[..., 1, 1]*m[..., 2, 0]))
+
+
+# Converts K values into link lengths [R1, R2, R3, R4], assuming the ground link has length r1
+# Degenerate results (K1 or K2 of zero, or an imaginary R3) return nan instead of raising
+def solve_linkage_dimensions(k_vals, r1=1.0):
+    k_vals = np.asarray(k_vals, dtype=float)
+    k1, k2, k3 = k_vals[..., 0], k_vals[..., 1], k_vals[..., 2]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r4 = np.where(k1 != 0, r1 / k1, np.nan)
+        r2 = np.where(k2 != 0, r1 / k2, np.nan)
+        r3_squared = r1**2 + r2**2 + r4**2 + 2*r2*r4*k3
+        r3 = np.sqrt(np.where(r3_squared >= 0, r3_squared, np.nan))
+
+    return np.stack((np.full_like(r2, r1), r2, r3, r4), axis=-1)
+
+
+# Maps the precision points onto the input and output angles for every pair of start angles
+# The fractions are where each precision point sits between the lower and upper bound (0 to 1)
+def map_precision_angles(theta2_starts, theta4_starts, theta2_fractions, theta4_fractions,
+                         theta2_max_rot, theta4_max_rot):
+    theta2_starts, theta4_starts = np.broadcast_arrays(np.asarray(theta2_starts, dtype=float),
+                                                       np.asarray(theta4_starts, dtype=float))
+    theta2_vals = theta2_starts[..., None] + theta2_max_rot * np.asarray(theta2_fractions, dtype=float)
+    theta4_vals = theta4_starts[..., None] + theta4_max_rot * np.asarray(theta4_fractions, dtype=float)
+    return theta2_vals, theta4_vals
+
+
+# Runs the full synthesis for every pair of start angles, returning the K values and link lengths
+def evaluate_candidates(theta2_starts, theta4_starts, theta2_fractions, theta4_fractions,
+                        theta2_max_rot, theta4_max_rot):
+    theta2_starts = np.asarray(theta2_starts, dtype=float)
+    theta4_starts = np.asarray(theta4_starts, dtype=float)
+
+    #a column of theta2 starts against a row of theta4 starts is a grid, which least squares can fit faster
+    if (np.size(theta2_fractions) > 3 and theta2_starts.ndim == 2 and theta4_starts.ndim == 2
+            and theta2_starts.shape[1] == 1 and theta4_starts.shape[0] == 1):
+        theta2_rows = theta2_starts + theta2_max_rot * np.asarray(theta2_fractions, dtype=float)
+        theta4_rows = theta4_starts.T + theta4_max_rot * np.asarray(theta4_fractions, dtype=float)
+        k_vals = fit_freudenstein_grid(theta2_rows, theta4_rows)
+        return k_vals, solve_linkage_dimensions(k_vals)
+
+    theta2_vals, theta4_vals = map_precision_angles(theta2_starts, theta4_starts,
+                                                    theta2_fractions, theta4_fractions,
+                                                    theta2_max_rot, theta4_max_rot)
+    k_vals = solve_freudenstein(theta2_vals, theta4_vals)
+    return k_vals, solve_linkage_dimensions(k_vals)
+
+
+# Checks which candidates have no negative (or nan) lengths, and optionally that the linkage can be
+# assembled at its starting angle using the cosine rule. The two are returned apart, so the reason a
+# candidate is rejected can be counted
+def candidate_checks(lengths, theta2_starts, ensure_validity=True):
+    lengths = np.asarray(lengths, dtype=float)
+    r1, r2, r3, r4 = lengths[..., 0], lengths[..., 1], lengths[..., 2], lengths[..., 3]
+    with np.errstate(invalid='ignore'):
+        non_negative = np.all(lengths >= 0, axis=-1)
+        if ensure_validity:
+            diagonal = np.sqrt(r1**2 + r2**2 - 2*r1*r2*np.cos(theta2_starts))
+            assembles = (diagonal + r4) > r3
+        else:
+            assembles = np.ones_like(non_negative)
+    return non_negative, assembles
+
+
+# Checks on the kind of linkage a candidate is, asked for by limits, a dictionary of
+#   "mechanism_types": indices into kinematics.MECHANISM_TYPES that are accepted, or None for any
+#   "full_range": whether the linkage must assemble over the whole turn of the input link
+#   "min_transmission_angle": smallest transmission angle accepted over the turn, in radians, or None
+# Returns the name of each check asked for with a mask that is True where it passes, in the order the
+# checks apply, so no limits gives an empty dictionary
+def limit_checks(lengths, theta2_starts, theta2_max_rot, limits=None) -> dict:
+    checks = {}
+    if not limits:
+        return checks
+    lengths = np.asarray(lengths, dtype=float)
+    r1, r2, r3, r4 = lengths[..., 0], lengths[..., 1], lengths[..., 2], lengths[..., 3]
+
+    if limits.get("mechanism_types") is not None:
+        checks["mechanism_type"] = np.isin(kinematics.mechanism_types(r1, r2, r3, r4), limits["mechanism_types"])
+    if limits.get("full_range") or limits.get("min_transmission_angle") is not None:
+        least, most = kinematics.diagonal_extremes(r1, r2, theta2_starts, theta2_max_rot)
+        with np.errstate(invalid='ignore'):
+            if limits.get("full_range"):
+                checks["full_range_assembly"] = (least > 0) & (least >= np.abs(r3 - r4)) & (most <= r3 + r4)
+            if limits.get("min_transmission_angle") is not None:
+                smallest = limits["min_transmission_angle"]
+                checks["transmission_angle"] = ((kinematics.transmission_angle(r3, r4, least) >= smallest)
+                                                & (kinematics.transmission_angle(r3, r4, most) <= np.pi - smallest))
+    return checks
+
+
+# Whether every candidate passes all of the limit_checks, shaped like non_negative
+def within_limits(checks, non_negative):
+    within = np.ones(np.shape(non_negative), dtype=bool)
+    for passes in checks.values():
+        within &= passes
+    return within
+
+
+# Number of candidates evaluated and rejected by each check, as recorded by profiling.SolverStats
+# Candidates are counted against the first check they fail, limit_checks coming after the other two
+def rejection_counts(non_negative, assembles, checks=None) -> dict:
+    counts = {"candidates_evaluated": int(np.size(non_negative)),
+              "rejected_negative_length": int(np.count_nonzero(~non_negative)),
+              "rejected_validity": int(np.count_nonzero(non_negative & ~assembles))}
+    remaining = non_negative & assembles
+    for name, passes in (checks or {}).items():
+        counts["rejected_" + name] = int(np.count_nonzero(remaining & ~passes))
+        remaining = remaining & passes
+    return counts
+
+
+# Adds up counts from rejection_counts
+def add_counts(total, counts) -> dict:
+    for name, amount in counts.items():
+        total[name] = total.get(name, 0) + amount
+    return total
+
+
+# Range of the link lengths of each candidate, which optimisation tries to minimise
+def length_ranges(lengths):
+    lengths = np.asarray(lengths, dtype=float)
+    return np.max(lengths, axis=-1) - np.min(lengths, axis=-1)
+
+
+# Structural error of each candidate: how far its output angle strays from the target mapping
+# between and beyond the precision points. x_fractions and y_fractions are dense samples of the
+# target as fractions of its x and y ranges. Both assembly branches are tried and the one closer
+# to the target is kept. Returns the max and RMS error in radians of output angle, which are
+# infinite if the linkage cannot be assembled somewhere in its motion
+def structural_errors(lengths, theta2_starts, theta4_starts, x_fractions, y_fractions,
+                      theta2_max_rot, theta4_max_rot):
+    lengths = np.asarray(lengths, dtype=float)
+    shape = lengths.shape[:-1]
+    lengths = lengths.reshape(-1, 4)
+    theta2_starts = np.broadcast_to(np.asarray(theta2_starts, dtype=float), shape).ravel()
+    theta4_starts = np.broadcast_to(np.asarray(theta4_starts, dtype=float), shape).ravel()
+    x_fractions = np.asarray(x_fractions, dtype=float)
+    y_fractions = np.asarray(y_fractions, dtype=float)
+
+    max_errors = np.empty(len(lengths))
+    rms_errors = np.empty(len(lengths))
+    chunk = max(1, GRID_BLOCK_SIZE // len(x_fractions))
+
+    for start in range(0, len(lengths), chunk):
+        r1, r2, r3, r4 = (lengths[start:start + chunk, i, None] for i in range(4))
+        theta2 = theta2_starts[start:start + chunk, None] + theta2_max_rot * x_fractions
+        target = theta4_starts[start:start + chunk, None] + theta4_max_rot * y_fractions
+
+        best_max = np.full(len(r1), np.inf)
+        best_rms = np.full(len(r1), np.inf)
+        for branch in (1, -1):
+            theta4, _ = kinematics.output_angles(r1, r2, r3, r4, theta2, branch)
+            error = np.abs(np.mod(theta4 - target + np.pi, 2*np.pi) - np.pi)
+            error = np.where(np.isnan(error), np.inf, error)
+            branch_max = np.max(error, axis=-1)
+            branch_rms = np.sqrt(np.mean(error**2, axis=-1))
+            better = branch_rms < best_rms
+            best_max = np.where(better, branch_max, best_max)
+            best_rms = np.where(better, branch_rms, best_rms)
+
+        max_errors[start:start + chunk] = best_max
+        rms_errors[start:start + chunk] = best_rms
+
+    return max_errors.reshape(shape), rms_errors.reshape(shape)
+
+
+# Score a sweep minimises for each candidate: the range of its lengths, or when scoring is given,
+# its structural error ("error") or the range plus error_weight times the error ("combined")
+# scoring holds the objective, error_weight, and the x_fractions and y_fractions of the dense samples
+# Errors are converted from output angle into units of y, and only worked out for feasible candidates
+def candidate_scores(lengths, feasible, theta2_starts, theta4_starts, theta2_max_rot, theta4_max_rot, scoring=None):
+    ranges = length_ranges(lengths)
+    if scoring is None or scoring["objective"] == "range":
+        return ranges
+
+    theta2_starts, theta4_starts, feasible = (np.broadcast_to(values, ranges.shape)
+                                              for values in (theta2_starts, theta4_starts, feasible))
+    errors = np.full(ranges.shape, np.inf)
+    max_errors, _ = structural_errors(np.asarray(lengths)[feasible], theta2_starts[feasible], theta4_starts[feasible],
+                                      scoring["x_fractions"], scoring["y_fractions"], theta2_max_rot, theta4_max_rot)
+    errors[feasible] = max_errors * scoring["y_per_radian"]
+
+    if scoring["objective"] == "error":
+        return errors
+    return ranges + scoring["error_weight"] * errors
+
+
+# Picks the candidate a serial scan over the flattened arrays would finish on
+# Without optimisation this is the first feasible candidate, otherwise it is the first candidate
+# below minimum_range or failing that the smallest range (earliest wins ties). Like the loop sweep,
+# optimisation never picks a candidate whose range is infinite or nan
+# Returns the index (None if nothing can be picked) and whether the scan would have stopped there
+def select_candidate(ranges, feasible, optimise, minimum_range):
+    feasible = np.ravel(feasible)
+    ranges = np.ravel(ranges)
+
+    if optimise:
+        feasible = feasible & np.isfinite(ranges)
+        ranges = np.where(feasible, ranges, np.inf)
+        stops = ranges < minimum_range
+    else:
+        stops = feasible
+
+    if stops.any():
+        return int(np.argmax(stops)), True
+    if optimise and feasible.any():
+        return int(np.argmin(ranges)), False
+    return None, False
+
+
+# Scans a block of theta2 start rows against every theta4 start, in the same order as a serial sweep
+# first_row is the index of the first row in the full sweep, so results from several blocks can be merged
+# Returns the chosen row, column, score, K values, lengths and whether the scan stopped there (or None),
+# along with the rejection_counts of every candidate it evaluated. Candidates failing the limit_checks are
+# rejected before candidate_scores scores the rest
+# record is an optional function called with the start angles, K values, lengths, checks, scores and whether
+# the candidates are within the limits, for each block evaluated, such as candidates.CandidateStore.append
+def sweep_rows(first_row, theta2_starts, theta4_starts, theta2_fractions, theta4_fractions,
+               theta2_max_rot, theta4_max_rot, ensure_validity, optimise, minimum_range, scoring=None,
+               limits=None, record=None):
+    rows_per_block = max(1, GRID_BLOCK_SIZE // len(theta4_starts))
+    best = None
+    counts = {}
+
+    for start in range(0, len(theta2_starts), rows_per_block):
+        #another worker already stopped on an earlier row, so nothing from here on can be chosen
+        if _stop_row is not None and _stop_row.value < first_row + start:
+            break
+
+        block = theta2_starts[start:start + rows_per_block, None]
+        k_vals, lengths = evaluate_candidates(block, theta4_starts[None, :],
+                                              theta2_fractions, theta4_fractions,
+                                              theta2_max_rot, theta4_max_rot)
+        non_negative, assembles = candidate_checks(lengths, block, ensure_validity)
+        checks = limit_checks(lengths, block, theta2_max_rot, limits)
+        add_counts(counts, rejection_counts(non_negative, assembles, checks))
+        within = within_limits(checks, non_negative)
+        feasible = non_negative & assembles & within
+        if optimise or record is not None:
+            scores = candidate_scores(lengths, feasible, block, theta4_starts[None, :],
+                                      theta2_max_rot, theta4_max_rot, scoring)
+        else:
+            scores = length_ranges(lengths)
+        if record is not None:
+            record(block, theta4_starts[None, :], k_vals, lengths, non_negative, assembles, scores, within)
+        index, stopped = select_candidate(scores, feasible, optimise, minimum_range)
+
+        if index is None:
+            continue
+
+        i, j = np.unravel_index(index, scores.shape)
+        if stopped or best is None or scores[i, j] < best["score"]:
+            best = {"row": first_row + start + int(i), "column": int(j), "score": float(scores[i, j]),
+                    "stopped": stopped, "k_vals": k_vals[i, j], "lengths": lengths[i, j]}
+        if stopped:
+            if _stop_row is not None:
+                with _stop_row.get_lock():
+                    _stop_row.value = min(_stop_row.value, best["row"])
+            break
+
+    return best, counts
+
+
+# Combines the results of sweep_rows over separate blocks into the one a single serial scan would give
+def merge_sweep_results(results):
+    results = [result for result in results if result is not None]
+    stopped = [result for result in results if result["stopped"]]
+
+    if stopped:
+        return min(stopped, key=lambda result: (result["row"], result["column"]))
+    if results:
+        return min(results, key=lambda result: (result["score"], result["row"], result["column"]))
+    return None
+
+
+def _share_stop_row(stop_row):
+    global _stop_row
+    _stop_row = stop_row
+
+
+# Runs sweep_rows over the theta2 start rows in a pool of worker processes
+# Workers share the earliest row a scan has stopped on, so the early exit stops all of them, and the
+# result is the same as a serial sweep no matter how many workers are used
+# Returns the merged result and the rejection_counts summed over every worker
+def parallel_sweep_rows(theta2_starts, theta4_starts, theta2_fractions, theta4_fractions,
+                        theta2_max_rot, theta4_max_rot, ensure_validity, optimise, minimum_range, scoring=None,
+                        limits=None, workers=2):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    stop_row = multiprocessing.Value("q", len(theta2_starts))
+    rows_per_task = max(1, math.ceil(len(theta2_starts) / (4 * workers)))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_share_stop_row, initargs=(stop_row,)) as pool:
+        futures = [pool.submit(sweep_rows, row, theta2_starts[row:row + rows_per_task], theta4_starts,
+                               theta2_fractions, theta4_fractions, theta2_max_rot, theta4_max_rot,
+                               ensure_validity, optimise, minimum_range, scoring, limits)
+                   for row in range(0, len(theta2_starts), rows_per_task)]
+        results = [future.result() for future in futures]
+
+    counts = {}
+    for _, block_counts in results:
+        add_counts(counts, block_counts)
+    return merge_sweep_results([best for best, _ in results]), counts
+
+
+# Version of the checkpoint files written by checkpointed_sweep_rows, older ones are not resumed
+CHECKPOINT_VERSION = 1
+
+
+# Identifies the sweep a checkpoint was written for, from every input that affects its result
+def sweep_fingerprint(theta2_starts, theta4_starts, theta2_fractions, theta4_fractions,
+                      theta2_max_rot, theta4_max_rot, ensure_validity, optimise, minimum_range, scoring=None,
+                      limits=None) -> str:
+    digest = hashlib.sha256()
+    for values in (theta2_starts, theta4_starts, theta2_fractions, theta4_fractions):
+        digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    settings = [theta2_max_rot, theta4_max_rot, ensure_validity, optimise, minimum_range, limits]
+    for key, value in sorted((scoring or {}).items()):
+        if isinstance(value, np.ndarray):
+            digest.update(np.ascontiguousarray(value, dtype=float).tobytes())
+        else:
+            settings.append([key, value])
+    digest.update(json.dumps(settings, default=repr).encode())
+    return digest.hexdigest()
+
+
+# sweep_rows over tiles of tile_rows theta2 start rows, saving the best result and rejection counts of
+# every tile to the JSON file at path as it finishes, so an interrupted sweep can carry on from the last
+# tile it finished by running it again. The file is replaced as a whole each time, never left half written
+# Gives the same result as one uninterrupted sweep, using parallel_sweep_rows for each tile if workers > 1
+# Raises ValueError if the file at path was written for a different sweep
+# Returns the merged result, the rejection_counts and the number of tiles that were already done
+def checkpointed_sweep_rows(path, theta2_starts, theta4_starts, theta2_fractions, theta4_fractions,
+                            theta2_max_rot, theta4_max_rot, ensure_validity, optimise, minimum_range,
+                            scoring=None, limits=None, tile_rows=64, workers=1):
+    arguments = (theta2_fractions, theta4_fractions, theta2_max_rot, theta4_max_rot,
+                 ensure_validity, optimise, minimum_range, scoring, limits)
+    fingerprint = sweep_fingerprint(theta2_starts, theta4_starts, *arguments)
+    state = {"version": CHECKPOINT_VERSION, "fingerprint": fingerprint, "tile_rows": tile_rows,
+             "tiles": math.ceil(len(theta2_starts) / tile_rows), "done": 0, "results": [], "counts": {}}
+
+    if os.path.exists(path):
+        with open(path) as file:
+            saved = json.load(file)
+        if saved.get("version") != CHECKPOINT_VERSION or saved.get("fingerprint") != fingerprint:
+            raise ValueError("checkpoint %s was written for a different sweep" % path)
+        state = saved
+    resumed = state["done"]
+
+    # tiles run in order, and once one stops early nothing after it can be chosen
+    while state["done"] < state["tiles"] and not any(result["stopped"] for result in state["results"]):
+        first_row = state["done"] * state["tile_rows"]
+        tile = theta2_starts[first_row:first_row + state["tile_rows"]]
+        if workers > 1:
+            best, counts = parallel_sweep_rows(tile, theta4_starts, *arguments, workers=workers)
+            if best is not None:
+                best["row"] += first_row
+        else:
+            best, counts = sweep_rows(first_row, tile, theta4_starts, *arguments)
+
+        if best is not None:
+            state["results"].append(dict(best, k_vals=np.asarray(best["k_vals"]).tolist(),
+                                         lengths=np.asarray(best["lengths"]).tolist()))
+        add_counts(state["counts"], counts)
+        state["done"] += 1
+        _write_checkpoint(path, state)
+
+    return merge_sweep_results(state["results"]), state["counts"], resumed
+
+
+def _write_checkpoint(path, state) -> None:
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
@@ -0,0 +1,220 @@
+import ast
+import functools
+import hashlib
+import itertools
+
+import numpy as np
+
+#####################################################
+##             Compiled Target Functions           ##
+#####################################################
+# Target functions y = f(x) for main.Solver, either expressions of x or tables of measured values
+
+EXPRESSION_CACHE_SIZE = 256     # Number of compiled expressions kept for the whole process
+
+# Functions and constants the fast path understands, by the name sympy gives them
+FAST_FUNCTIONS = {"sin": np.sin, "cos": np.cos, "tan": np.tan, "asin": np.arcsin, "acos": np.arccos,
+                  "atan": np.arctan, "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh, "asinh": np.arcsinh,
+                  "acosh": np.arccosh, "atanh": np.arctanh, "exp": np.exp, "log": np.log, "sqrt": np.sqrt,
+                  "Abs": np.abs, "abs": np.abs}
+FAST_CONSTANTS = {"pi": np.pi, "E": np.e}
+FAST_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd)
+
+
+# Parses simple arithmetic of x (numbers, + - * / **, and the FAST_FUNCTIONS and FAST_CONSTANTS)
+# without loading sympy, returning its syntax tree with whole numbers made floats. Returns None for
+# anything else, which is then left to sympy
+def fast_parse(source):
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError:
+        return None
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Load) + FAST_OPERATORS):
+            continue
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            continue
+        if isinstance(node, ast.Name) and (node.id == "x" or node.id in FAST_CONSTANTS or node.id in FAST_FUNCTIONS):
+            continue
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FAST_FUNCTIONS
+                and len(node.args) == 1 and not node.keywords):
+            continue
+        return None
+
+    # names can only be used the way they are meant to, functions called and everything else not
+    called = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and (node.id in FAST_FUNCTIONS) != (id(node) in called):
+            return None
+
+    # whole numbers are made floats, so powers of them overflow at once rather than growing without limit
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            node.value = float(node.value)
+    return tree
+
+
+# Compiles an expression fast_parse understands straight into a numpy function, or returns None
+def fast_compile(source, tree=None):
+    tree = tree or fast_parse(source)
+    if tree is None:
+        return None
+    code = compile(tree, "<expression>", "eval")
+    namespace = dict(FAST_FUNCTIONS, **FAST_CONSTANTS, __builtins__={})
+    return lambda x_vals: eval(code, namespace, {"x": x_vals})
+
+
+# A target function y = f(x), compiled into a vectorised numpy function
+# Simple expressions are compiled directly by fast_compile, anything else is parsed with sympy
+# Calling it with a number or an array of x values returns the y values as floats
+class CompiledExpression:
+    def __init__(self, source) -> None:
+        self.source = source
+        self._expr = None
+        self.tree = fast_parse(source)          # Syntax tree of an expression the fast path compiled, else None
+        self.numeric = fast_compile(source, self.tree)
+        if self.numeric is None:
+            import sympy as sym
+            self.numeric = sym.lambdify(sym.Symbol("x"), self.expr, modules="numpy")
+        pass
+
+    # The sympy expression, only parsed when it is first needed
+    @property
+    def expr(self):
+        if self._expr is None:
+            import sympy.parsing.sympy_parser as parser
+            self._expr = parser.parse_expr(self.source)
+        return self._expr
+
+    def __call__(self, x_vals):
+        x_vals = np.asarray(x_vals, dtype=float)
+        # constant functions ignore x, so broadcast them back to the shape that was passed in
+        return np.broadcast_to(np.asarray(self.numeric(x_vals), dtype=float), x_vals.shape).copy()
+
+    # Normalised form of the expression. Expressions the fast path compiled are identified by their syntax
+    # tree, which ignores spacing, brackets and how numbers are written, so sympy is not loaded for them
+    # Any other is the same for every source string sympy parses to the same thing
+    def canonical(self) -> str:
+        if self.tree is not None:
+            return "ast:" + ast.dump(self.tree)
+        import sympy as sym
+        return sym.srepr(self.expr)
+
+    def __str__(self) -> str:
+        return str(self.expr)
+
+
+# Returns the compiled expression for the source string, reusing it if it has been compiled before
+# Raises whatever sympy raises if the string cannot be parsed
+@functools.lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(source) -> CompiledExpression:
+    return CompiledExpression(source)
+
+
+# Largest relative difference between the gaps of a table that still counts as evenly spaced
+UNIFORM_TOLERANCE = 1e-9
+TABLE_CHUNK_ROWS = 65536        # Rows of a CSV table parsed at a time
+SORTED_SEARCH_SIZE = 4096       # Number of x values above which unsorted ones are sorted before searching a table
+
+
+# A target function y = f(x) given by a table of measured (x, y) values, interpolated linearly
+# The x values are sorted if they are not already, and must be distinct. Evenly spaced tables are
+# looked up by arithmetic, others by a binary search of x, so any number of x values are interpolated
+# with a few array operations. Calling it with x outside the table raises ValueError
+# x and y may be memory-mapped arrays, which are only copied if they need sorting
+class TabulatedFunction:
+    def __init__(self, x_vals, y_vals, name=None) -> None:
+        x_vals, y_vals = np.asarray(x_vals, dtype=float), np.asarray(y_vals, dtype=float)
+        if x_vals.ndim != 1 or x_vals.shape != y_vals.shape or len(x_vals) < 2:
+            raise ValueError("a table needs matching one dimensional x and y columns of at least 2 values")
+        if not (np.all(np.isfinite(x_vals)) and np.all(np.isfinite(y_vals))):
+            raise ValueError("a table cannot hold nan or infinite values")
+
+        gaps = np.diff(x_vals)
+        if np.any(gaps <= 0):
+            order = np.argsort(x_vals, kind="stable")
+            x_vals, y_vals = x_vals[order], y_vals[order]
+            gaps = np.diff(x_vals)
+            if np.any(gaps == 0):
+                raise ValueError("a table cannot give more than one y value for the same x")
+        self.x_vals = x_vals
+        self.y_vals = y_vals
+        self.name = name            # Where the table came from, only used to describe it
+
+        self.step = (x_vals[-1] - x_vals[0]) / (len(x_vals) - 1)
+        self.uniform = bool(np.all(np.abs(gaps - self.step) <= UNIFORM_TOLERANCE * self.step))
+
+        # identifies the table by its contents, the way a source string identifies an expression
+        digest = hashlib.sha256(np.ascontiguousarray(x_vals).tobytes())
+        digest.update(np.ascontiguousarray(y_vals).tobytes())
+        self.source = "table:" + digest.hexdigest()
+        pass
+
+    def __call__(self, x_vals):
+        x_vals = np.asarray(x_vals, dtype=float)
+        first, last = self.x_vals[0], self.x_vals[-1]
+        if np.any((x_vals < first) | (x_vals > last)):
+            raise ValueError("x values must lie within the table, which covers %g to %g" % (first, last))
+
+        if self.uniform:
+            index = ((x_vals - first) / self.step).astype(np.intp)
+        elif x_vals.size > SORTED_SEARCH_SIZE and np.any(np.diff(x_vals.ravel()) < 0):
+            # searching for sorted values reuses each result as a hint for the next, which is several
+            # times faster on large tables than searching in random order, even after the sort
+            order = np.argsort(x_vals, axis=None)
+            index = np.empty(x_vals.size, dtype=np.intp)
+            index[order] = np.searchsorted(self.x_vals, x_vals.ravel()[order], side="right") - 1
+            index = index.reshape(x_vals.shape)
+        else:
+            index = np.searchsorted(self.x_vals, x_vals, side="right") - 1
+        index = np.clip(index, 0, len(self.x_vals) - 2)
+
+        x0, x1 = self.x_vals[index], self.x_vals[index + 1]
+        y0, y1 = self.y_vals[index], self.y_vals[index + 1]
+        return y0 + (x_vals - x0) * ((y1 - y0) / (x1 - x0))
+
+    # The same for any two tables holding the same values
+    def canonical(self) -> str:
+        return self.source
+
+    def __str__(self) -> str:
+        name = " " + self.name if self.name else ""
+        return "table%s of %d points from x = %g to %g" % (name, len(self.x_vals), self.x_vals[0], self.x_vals[-1])
+
+
+# Reads a table of (x, y) values from a file, taking x and y from the given columns
+# A .npy file holding a two dimensional array is memory-mapped rather than read. Any other file is read
+# as delimited text, TABLE_CHUNK_ROWS lines at a time, skipping a first line that is not numbers
+def load_table(path, x_column=0, y_column=1, delimiter=",") -> TabulatedFunction:
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        if data.ndim != 2:
+            raise ValueError("%s must hold a two dimensional array of columns" % path)
+        return TabulatedFunction(data[:, x_column], data[:, y_column], name=path)
+
+    chunks = []
+    with open(path) as file:
+        lines = iter(file)
+        first = next(lines, "")
+        try:
+            chunks.append(np.loadtxt([first], delimiter=delimiter, usecols=(x_column, y_column), ndmin=2))
+        except ValueError:
+            pass        # a header
+        while True:
+            block = list(itertools.islice(lines, TABLE_CHUNK_ROWS))
+            if not block:
+                break
+            chunks.append(np.loadtxt(block, delimiter=delimiter, usecols=(x_column, y_column), ndmin=2))
+    if not chunks:
+        raise ValueError("%s holds no rows" % path)
+    data = np.concatenate(chunks)
+    return TabulatedFunction(data[:, 0], data[:, 1], name=path)
+
+
+# The target function for a Solver: a TabulatedFunction (or anything else callable with an array of x
+# and giving canonical() and source) is used as it is, and a string is compiled by compile_expression
+def target_function(func):
+    if isinstance(func, str):
+        return compile_expression(func)
+    return func
@@ -0,0 +1,166 @@
+import math
+
+import numpy as np
+
+#####################################################
+##             Four Bar Linkage Kinematics         ##
+#####################################################
+# Vectorised position, velocity and acceleration analysis of the linkage drawn by plotter.Plotter.
+# The ground link runs from A = (0, 0) to D = (r1, 0), the input link AB is at theta2, the coupler BC
+# is at theta3 and the output link is DC, with C = D - r4*(cos(theta4), sin(theta4)) as in the
+# Freudenstein equation used by main.Solver.
+
+# One sample of a motion study: time, link angles, angular velocities and accelerations of links 3
+# and 4, the transmission angle between links 3 and 4, and whether the linkage assembles there
+MOTION_FIELDS = ("t", "theta2", "theta3", "theta4", "omega3", "omega4", "alpha3", "alpha4", "transmission")
+MOTION_DTYPE = np.dtype([(field, "f8") for field in MOTION_FIELDS] + [("assembled", "?")])
+
+
+# Grashof classes of four bar linkage, kinematics.mechanism_types gives each linkage the index of its class
+MECHANISM_TYPES = ("crank-rocker", "double-crank", "rocker-crank", "double-rocker", "change-point", "triple-rocker")
+
+# Relative difference between s + l and p + q below which a linkage is taken to be a change point linkage
+CHANGE_POINT_TOLERANCE = 1e-9
+
+
+# Index into MECHANISM_TYPES of every linkage, or -1 where a length is negative or nan
+# Grashof linkages, with shortest + longest < the sum of the other two links, are named by their shortest
+# link: the input link (r2) gives a crank-rocker, the ground (r1) a double crank, the output link (r4) a
+# rocker-crank and the coupler (r3) a double rocker. Other linkages are change point or triple rocker linkages
+def mechanism_types(r1, r2, r3, r4):
+    lengths = np.stack(np.broadcast_arrays(r1, r2, r3, r4), axis=-1).astype(float)
+    ordered = np.sort(lengths, axis=-1)
+    excess = ordered[..., 0] + ordered[..., 3] - ordered[..., 1] - ordered[..., 2]
+    tolerance = CHANGE_POINT_TOLERANCE * ordered[..., 3]
+
+    grashof = np.array([1, 0, 3, 2])[np.argmin(lengths, axis=-1)]
+    types = np.where(excess < -tolerance, grashof, np.where(excess > tolerance, 5, 4))
+    with np.errstate(invalid='ignore'):
+        valid = np.all(lengths >= 0, axis=-1)
+    return np.where(valid, types, -1).astype(np.int8)
+
+
+# Shortest and longest the diagonal BD gets as the input link turns from theta2_start through theta2_rot
+# BD only depends on cos(theta2), so it is longest or shortest at either end of the turn, or where the
+# input link passes theta2 = pi or 0 on the way
+def diagonal_extremes(r1, r2, theta2_start, theta2_rot):
+    lower = np.minimum(theta2_start, np.add(theta2_start, theta2_rot))
+    upper = np.maximum(theta2_start, np.add(theta2_start, theta2_rot))
+    ends = [r1**2 + r2**2 - 2*r1*r2*np.cos(theta2) for theta2 in (lower, upper)]     # using cosine rule
+
+    passes_zero = 2*np.pi*np.floor(upper / (2*np.pi)) >= lower
+    passes_pi = 2*np.pi*np.floor((upper - np.pi) / (2*np.pi)) + np.pi >= lower
+    least = np.where(passes_zero, np.subtract(r1, r2)**2, np.minimum(*ends))
+    most = np.where(passes_pi, np.add(r1, r2)**2, np.maximum(*ends))
+    return np.sqrt(np.maximum(least, 0)), np.sqrt(most)
+
+
+# Transmission angle between links 3 and 4 for a diagonal BD of the given length, 0 or pi where the
+# linkage cannot be assembled. It falls as BD shrinks, so diagonal_extremes gives its range over a turn
+def transmission_angle(r3, r4, diagonal):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.arccos(np.clip((r3**2 + r4**2 - diagonal**2) / (2*r3*r4), -1.0, 1.0))
+
+
+# Output angle theta4 for every input angle theta2, and a mask that is False where the linkage
+# cannot be assembled (theta4 is nan there). The lengths may be arrays broadcasting against theta2
+# Branch 1 is the assembly used by the original cosine rule construction in Plotter, where C
+# lies clockwise of the diagonal DB as seen from D, branch -1 is the other (crossed) assembly
+def output_angles(r1, r2, r3, r4, theta2, branch=1):
+    theta2 = np.asarray(theta2, dtype=float)
+    bx = r2 * np.cos(theta2)
+    by = r2 * np.sin(theta2)
+
+    diagonal = np.hypot(bx - r1, by)                                        # length of BD
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_angle = (r4**2 + diagonal**2 - r3**2) / (2*r4*diagonal)         # using cosine rule
+    assembled = (diagonal > 0) & (np.abs(cos_angle) <= 1)
+
+    angle = np.arccos(np.clip(np.where(assembled, cos_angle, 1.0), -1.0, 1.0))
+    theta4 = np.arctan2(by, bx - r1) - branch*angle - np.pi
+    return np.where(assembled, theta4, np.nan), assembled
+
+
+# Positions of joints A, B, C and D for every input angle, as an (n, 8) float array with columns
+# Ax, Ay, Bx, By, Cx, Cy, Dx, Dy, and a mask that is True where the linkage cannot be assembled
+# Rows that cannot be assembled hold nan for C instead of raising
+def linkage_positions(r1, r2, r3, r4, theta2):
+    theta2 = np.ravel(np.asarray(theta2, dtype=float))
+    theta4, assembled = output_angles(r1, r2, r3, r4, theta2)
+
+    points = np.zeros((len(theta2), 8))
+    points[:, 2] = r2 * np.cos(theta2)
+    points[:, 3] = r2 * np.sin(theta2)
+    points[:, 4] = r1 - r4 * np.cos(theta4)
+    points[:, 5] = -r4 * np.sin(theta4)
+    points[:, 6] = r1
+    return points, ~assembled
+
+
+# Angles, angular velocities and accelerations of links 3 and 4 and the transmission angle, for every
+# input angle theta2 with input angular velocity omega2 and acceleration alpha2 (broadcast against theta2)
+# Differentiates the loop closure r2*e^(i theta2) + r3*e^(i theta3) + r4*e^(i theta4) = r1 twice
+# Returns a MOTION_DTYPE array with t left at 0, where samples that cannot be assembled hold nan
+def motion_states(r1, r2, r3, r4, theta2, omega2, alpha2=0.0, branch=1):
+    theta2 = np.asarray(theta2, dtype=float)
+    omega2, alpha2 = np.broadcast_to(omega2, theta2.shape), np.broadcast_to(alpha2, theta2.shape)
+    theta4, assembled = output_angles(r1, r2, r3, r4, theta2, branch)
+    theta3 = np.arctan2(-r4*np.sin(theta4) - r2*np.sin(theta2), r1 - r4*np.cos(theta4) - r2*np.cos(theta2))
+
+    s34, c34 = np.sin(theta3 - theta4), np.cos(theta3 - theta4)
+    s24, c24 = np.sin(theta2 - theta4), np.cos(theta2 - theta4)
+    s23, c23 = np.sin(theta2 - theta3), np.cos(theta2 - theta3)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        omega3 = -r2*omega2*s24 / (r3*s34)
+        omega4 = r2*omega2*s23 / (r4*s34)
+        alpha3 = -(r2*(alpha2*s24 + omega2**2*c24) + r3*omega3**2*c34 + r4*omega4**2) / (r3*s34)
+        alpha4 = (r2*(alpha2*s23 + omega2**2*c23) + r4*omega4**2*c34 + r3*omega3**2) / (r4*s34)
+
+    transmission = transmission_angle(r3, r4, np.sqrt(r1**2 + r2**2 - 2*r1*r2*np.cos(theta2)))   # using cosine rule
+
+    states = np.zeros(theta2.shape, dtype=MOTION_DTYPE)
+    for field, values in (("theta2", theta2), ("theta3", theta3), ("theta4", theta4), ("omega3", omega3),
+                          ("omega4", omega4), ("alpha3", alpha3), ("alpha4", alpha4), ("transmission", transmission)):
+        states[field] = np.where(assembled, values, np.nan)
+    states["assembled"] = assembled
+    return states
+
+
+# Streams a motion study in chunks of at most chunk_size samples, so memory stays bounded however long it runs
+# The input starts at theta2_start with angular velocity omega2 and constant angular acceleration alpha2,
+# and is sampled every time_step seconds for duration seconds (both ends included)
+# Yields MOTION_DTYPE arrays, which can be passed straight to write_motion_csv or write_motion_binary
+def stream_motion(r1, r2, r3, r4, theta2_start, omega2, duration, time_step, alpha2=0.0, branch=1,
+                  chunk_size=65536):
+    count = math.floor(duration / time_step + 1e-9) + 1
+    for start in range(0, count, chunk_size):
+        t = time_step * np.arange(start, min(start + chunk_size, count))
+        theta2 = theta2_start + omega2*t + 0.5*alpha2*t**2
+        states = motion_states(r1, r2, r3, r4, theta2, omega2 + alpha2*t, alpha2, branch)
+        states["t"] = t
+        yield states
+
+
+# Writes chunks of a motion study to a text file as CSV with a header row, one chunk at a time
+# Returns the number of samples written
+def write_motion_csv(chunks, file) -> int:
+    file.write(",".join(MOTION_DTYPE.names) + "\n")
+    line = ",".join(["%.10g"] * len(MOTION_FIELDS) + ["%d"]) + "\n"
+    written = 0
+    for chunk in chunks:
+        # formatting the whole chunk with one operation is several times faster than numpy.savetxt
+        values = np.column_stack([chunk[field] for field in MOTION_DTYPE.names]).ravel().tolist()
+        file.write((line * len(chunk)) % tuple(values))
+        written += len(chunk)
+    return written
+
+
+# Writes chunks of a motion study to a binary file as raw MOTION_DTYPE records, one chunk at a time
+# Read it back with numpy.fromfile(path, dtype=MOTION_DTYPE), or numpy.memmap for long studies
+# Returns the number of samples written
+def write_motion_binary(chunks, file) -> int:
+    written = 0
+    for chunk in chunks:
+        file.write(np.ascontiguousarray(chunk, dtype=MOTION_DTYPE).tobytes())
+        written += len(chunk)
+    return written
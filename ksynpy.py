@@ -11,16 +11,15 @@ See the GNU General Public License for more details.
 You should have received a copy of the GNU General Public License 
 along with this program. If not, see http://www.gnu.org/licenses/.
 """
-import cmath as cm
 import numpy.linalg as lm
 import numpy as np
-import sympy as sp
 import sys
 import getopt
-import matplotlib.pyplot as plt
-from cmath import * 
-from numpy import *
-from math import *
+
+import engine
+import expressions
+
+# matplotlib is only imported by the functions that plot, so the numeric functions load quickly
 
 def main():
     try:
@@ -56,118 +55,129 @@ def help1(n):
     print("Refer to documentation on how to use the following program for analysis \n")
     print("1. Loop Closure Equation - from ksynpy import lpcs \n lpcs(ang_vel2,ang_vel3,ang_vel4,ang_acc2,ang_acc3,ang_acc4) \n")
     print("2. Three Position Synthesis - from ksynpy import thpos \n thpos(len2,len3,gamma2,gamma3,psi2,psi3,phi2,phi3) \n")    
+    print("   For arrays of inputs without printing or plotting use lpcs_batch and thpos_batch with the same arguments \n")
     print("3. Freudenstein Equation Analysis - from ksynpy import frst \n frst('func(x)',init_x,fin_x,no_of_pos,crk_ang,swing_ang1,roc_ang,swing_ang2) \n") 
     
+# Structured results of lpcs_batch and thpos_batch, link lengths and angles in degrees
+LPCS_DTYPE=np.dtype([('length',float,(4,)),('angle',float,(4,))])
+THPOS_DTYPE=np.dtype([('length',float,(6,)),('angle',float,(6,)),('solved',bool)])
+
+def lpcs_batch(w2,w3,w4,a2,a3,a4):
+    # Loop closure synthesis for arrays of angular velocities and accelerations, broadcast together
+    # Returns an LPCS_DTYPE array of the same shape, without printing or plotting
+    w2,w3,w4,a2,a3,a4=np.broadcast_arrays(*(np.asarray(v,dtype=float) for v in (w2,w3,w4,a2,a3,a4)))
+    c2=a2+1j*w2**2
+    c3=a3+1j*w3**2
+    c4=a4+1j*w4**2
+    r2=w4*c3-w3*c4
+    r3=w2*c4-w4*c2
+    r4=w3*c2-w2*c3
+    r1=-r2-r3-r4
+    links=np.stack([r1,r2,r3,r4],axis=-1)
+    out=np.empty(w2.shape,dtype=LPCS_DTYPE)
+    out['length']=np.abs(links)
+    out['angle']=np.angle(links,deg=True)
+    return out
+
 def lpcs(w2,w3,w4,a2,a3,a4):
-    r2 = w4*(complex(a3,w3**2)) - w3*(complex(a4,w4**2))
-    r3 = w2*(complex(a4,w4**2)) - w4*(complex(a2,w2**2))
-    r4 = w3*(complex(a2,w2**2)) - w2*(complex(a3,w3**2))
-    r1 = -r2-r3-r4
-    r1_l=abs(r1)
-    r1_a=cm.phase(r1)*180/cm.pi
-    r2_l=abs(r2)
-    r2_a=cm.phase(r2)*180/cm.pi
-    r3_l=abs(r3)
-    r3_a=cm.phase(r3)*180/cm.pi
-    r4_l=abs(r4)
-    r4_a=cm.phase(r4)*180/cm.pi
+    import matplotlib.pyplot as plt
+    res=lpcs_batch(w2,w3,w4,a2,a3,a4)
+    r1_l,r2_l,r3_l,r4_l=res['length']
+    r1_a,r2_a,r3_a,r4_a=res['angle']
     a=180-r1_a
-    plt.hold('on')
     plt.plot([0,r2_l*np.cos((a+r2_a)*np.pi/180),r3_l*np.cos((a+r3_a)*np.pi/180),r1_l*np.cos((a+r4_a)*np.pi/180)],[0,r2_l*np.sin((a+r2_a)*np.pi/180),r3_l*np.sin((a+r3_a)*np.pi/180),0],color='k')
     print(" Link 1 \t {0:.3f} \t {1:.3f}  \n Link 2 \t {2:.3f} \t {3:.3f} \n Link 3 \t {4:.3f} \t {5:.3f} \n Link 4 \t {6:.3f} \t {7:.3f}".format(r1_l,r1_a,r2_l,r2_a,r3_l,r3_a,r4_l,r4_a))
-        
-def thpos(d2,d3,gamma2,gamma3,psi2,psi3,phi2,phi3):
-    Al=[[cm.exp(psi2*cm.pi*1j/180)-1,cm.exp(gamma2*cm.pi*1j/180)-1],[cm.exp(psi3*cm.pi*1j/180)-1,cm.exp(gamma3*cm.pi*1j/180)-1]]
-    Bl=[[d2],[d3]]
-    Cl=lm.solve(Al,Bl)
-    l1=Cl[0]
-    l2=Cl[1]
-    Ar=[[cm.exp(phi2*cm.pi*1j/180)-1,cm.exp(gamma2*cm.pi*1j/180)-1],[cm.exp(phi3*cm.pi*1j/180)-1,cm.exp(gamma3*cm.pi*1j/180)-1]]
-    Br=[[d2],[d3]]
-    Cr=lm.solve(Ar,Br)
-    l3=Cr[0]
-    l4=Cr[1]
+
+def _dyad_batch(d2,d3,gamma2,gamma3,rot2,rot3):
+    # Solves [[e^(i rot2)-1, e^(i gamma2)-1], [e^(i rot3)-1, e^(i gamma3)-1]] [w, z] = [d2, d3] for
+    # every tuple at once by Cramer's rule, singular systems give nan
+    m00=np.exp(1j*np.radians(rot2))-1
+    m01=np.exp(1j*np.radians(gamma2))-1
+    m10=np.exp(1j*np.radians(rot3))-1
+    m11=np.exp(1j*np.radians(gamma3))-1
+    det=m00*m11-m01*m10
+    solved=np.abs(det)>1e-12
+    det=np.where(solved,det,np.nan)
+    with np.errstate(invalid='ignore'):
+        return (d2*m11-m01*d3)/det,(m00*d3-d2*m10)/det,solved
+
+def thpos_batch(d2,d3,gamma2,gamma3,psi2,psi3,phi2,phi3):
+    # Three position synthesis for arrays of (d2, d3, gamma, psi, phi) tuples, broadcast together
+    # d2 and d3 may be complex. Returns a THPOS_DTYPE array of the same shape, without printing or
+    # plotting, where solved is False (and the links nan) if either dyad has no unique solution
+    d2,d3=np.asarray(d2,dtype=complex),np.asarray(d3,dtype=complex)
+    d2,d3,gamma2,gamma3,psi2,psi3,phi2,phi3=np.broadcast_arrays(d2,d3,*(np.asarray(v,dtype=float) for v in (gamma2,gamma3,psi2,psi3,phi2,phi3)))
+    l1,l2,left=_dyad_batch(d2,d3,gamma2,gamma3,psi2,psi3)
+    l3,l4,right=_dyad_batch(d2,d3,gamma2,gamma3,phi2,phi3)
     l5=l2-l4
     l6=l1+l5-l3
-    l1_l=abs(l1)
-    l1_a=atan2(l1.imag,l1.real)*180/pi
-    l2_l=abs(l2)
-    l2_a=atan2(l2.imag,l2.real)*180/pi
-    l3_l=abs(l3)
-    l3_a=atan2(l3.imag,l3.real)*180/pi
-    l4_l=abs(l4)
-    l4_a=atan2(l4.imag,l4.real)*180/pi
-    l5_l=abs(l5)
-    l5_a=atan2(l5.imag,l5.real)*180/pi
-    l6_l=abs(l6)
-    l6_a=atan2(l6.imag,l6.real)*180/pi
+    links=np.stack([l1,l2,l3,l4,l5,l6],axis=-1)
+    out=np.empty(d2.shape,dtype=THPOS_DTYPE)
+    out['length']=np.abs(links)
+    out['angle']=np.angle(links,deg=True)
+    out['solved']=left&right
+    return out
+
+def thpos(d2,d3,gamma2,gamma3,psi2,psi3,phi2,phi3):
+    import matplotlib.pyplot as plt
+    res=thpos_batch(d2,d3,gamma2,gamma3,psi2,psi3,phi2,phi3)
+    if not res['solved']:
+        raise lm.LinAlgError('Singular matrix')
+    l1_l,l2_l,l3_l,l4_l,l5_l,l6_l=res['length']
+    l1_a,l2_a,l3_a,l4_a,l5_a,l6_a=res['angle']
     print('The link lengths are \n Link 1={} \n Link 2={} \n Link 3={} \n Link 4={} \n Link 5={} \n Link 6={}'.format(l1_l,l2_l,l3_l,l4_l,l5_l,l6_l))
     print('The link angles are \n Link 1={} \n Link 2={} \n Link 3={} \n Link 4={} \n Link 5={} \n Link 6={})'.format(l1_a,l2_a,l3_a,l4_a,l5_a,l6_a))
-    plt.hold('on')    
     plt.plot([0,l1_l*np.cos((l1_a)*np.pi/180),l1_l*np.cos((l1_a)*np.pi/180)+l2_l*np.cos((l2_a)*np.pi/180),l3_l*np.cos((l3_a)*np.pi/180)+l6_l*np.cos((l6_a)*np.pi/180),l6_l*np.cos((l6_a)*np.pi/180)],[0,l1_l*np.sin((l1_a)*np.pi/180),l1_l*np.sin((l1_a)*np.pi/180)+l2_l*np.sin((l2_a)*np.pi/180),l3_l*np.sin((l3_a)*np.pi/180)+l6_l*np.sin((l6_a)*np.pi/180),l6_l*np.sin((l6_a)*np.pi/180)],color='k')
-    plt.hold('on')
     plt.plot([l3_l*np.cos((l3_a)*np.pi/180)+l6_l*np.cos((l6_a)*np.pi/180),l1_l*np.cos((l1_a)*np.pi/180)],[l3_l*np.sin((l3_a)*np.pi/180)+l6_l*np.sin((l6_a)*np.pi/180),l1_l*np.sin((l1_a)*np.pi/180)],'k')
-    plt.hold('on')
     plt.plot([l6_l*np.cos((l6_a)*np.pi/180),0],[l6_l*np.sin((l6_a)*np.pi/180),0])
         
     
-def frst(f1,x0,x_n,n,psi1,s1,phi1,s2):
-    f2=sp.simplify(f1)
+def frst_solve(f1,x0,x_n,n,psi1,s1,phi1,s2):
+    # Freudenstein synthesis done numerically, with no printing or plotting, so it can be called in loops
+    # Angles are in degrees as in frst. The target is compiled once and reused for later calls, and
+    # with more than 3 positions K1 to K3 are fitted to all of them by least squares
+    # Returns a dict of the link lengths, the K values and the x, y, psi and phi tables, which hold
+    # the start point, the n Chebyshev precision points and the end point. Unusable designs give nan lengths
+    if n<3:
+        raise ValueError('at least 3 positions are needed, not {}'.format(n))
+    f2=expressions.compile_expression(f1)
     psi2=psi1+s1
     phi2=phi1+s2
-    xf=np.zeros(n+2)
-    yf=np.zeros(n+2)
-    xf[0]=x0 
-    yf[0]=f2.subs({'x':x0}).evalf()
-    xf[n+1]=x_n 
-    yf[n+1]=f2.subs({'x':x_n}).evalf()
-    for k in range(3):
-        xf[k+1]=(x0+x_n)/2.0 - (((x_n-x0)/2.0)*np.cos((2*(k+1)-1)*np.pi/(2*n)))
-        yf[k+1]=f2.subs({'x':xf[k+1]}).evalf()
-    
-    a2,b2=sp.symbols('a2,b2')
-    eqs=(a2*x0 + b2 - psi1, a2*x_n + b2 - psi2) 
-    loo=sp.solve(eqs,[b2,a2])
-    a1=loo[a2] 
-    b1=loo[b2]
-    eqs=(a2*yf[0] + b2 - phi1, a2*yf[n+1] + b2 - phi2)
-    loo=sp.solve(eqs,[b2,a2])
-    c1=loo[a2] 
-    d1=loo[b2]
-    psi=np.zeros(n+2) 
-    phi=np.zeros(n+2)
-    psi[n-n]=psi1 
-    psi[n+1]=psi2 
-    phi[n-n]=phi1 
-    phi[n+1]=phi2
-    for k in range(3):
-        psi[k+1]=a1*xf[k+1]+b1
-        phi[k+1]=c1*yf[k+1]+d1
-    
-    k11,k22,k33=sp.symbols('k11,k22,k33')
-    eqn1=k11*np.cos(psi[1]*np.pi/180)+k22*np.cos(phi[1]*np.pi/180)+k33-np.cos((psi[1]-phi[1])*np.pi/180)
-    eqn2=k11*np.cos(psi[2]*np.pi/180)+k22*np.cos(phi[2]*np.pi/180)+k33-np.cos((psi[2]-phi[2])*np.pi/180)
-    eqn3=k11*np.cos(psi[3]*np.pi/180)+k22*np.cos(phi[3]*np.pi/180)+k33-np.cos((psi[3]-phi[3])*np.pi/180)
-    las=sp.solve([eqn1,eqn2,eqn3],[k33,k22,k11])
-    k1=las[k11]
-    k2=las[k22]
-    k3=las[k33]
+    xf=np.empty(n+2)
+    xf[0]=x0
+    xf[n+1]=x_n
+    xf[1:n+1]=(x0+x_n)/2.0 - (((x_n-x0)/2.0)*np.cos((2*np.arange(1,n+1)-1)*np.pi/(2*n)))
+    yf=f2(xf)
+    a1,b1=engine.linear_map(x0,x_n,psi1,psi2)
+    c1,d1=engine.linear_map(yf[0],yf[n+1],phi1,phi2)
+    psi=a1*xf+b1
+    phi=c1*yf+d1
+    psi[0],psi[n+1],phi[0],phi[n+1]=psi1,psi2,phi1,phi2
+    k=engine.solve_freudenstein(np.radians(psi[1:n+1]),np.radians(phi[1:n+1]))
+    lengths=engine.solve_linkage_dimensions(k)
+    return {'lengths':lengths.tolist(),'k':k.tolist(),'x':xf,'y':yf,'psi':psi,'phi':phi}
+
+def frst(f1,x0,x_n,n,psi1,s1,phi1,s2,plot=True):
+    # Runs frst_solve, then with plot set prints the lengths and the table and shows the linkage in each
+    # position as before. Returns the result of frst_solve either way
+    res=frst_solve(f1,x0,x_n,n,psi1,s1,phi1,s2)
+    if not plot:
+        return res
+    import matplotlib.pyplot as plt
+    r1,r2,r3,r4=res['lengths']
+    xf,yf,psi,phi=res['x'],res['y'],res['psi'],res['phi']
     col=['r','b','g','k','r']
-    r1=1
-    r2=r1/k2
-    r4=r1/k1
-    r3=((2*r2*r4*k3)+r1**2+r2**2+r4**2)**0.5
     ax = plt.axes(xlim=(-3, 3), ylim=(-3, 3))
     ax.set_aspect('equal')
     ax.grid(visible=True, color='grey', linestyle='-', linewidth=1)
-    for k in range(5):
-        #plt.hold('on')
-        plt.plot([0,r2*cos(psi[k]*pi/180),r4*cos((phi[k]-180)*pi/180),1],[0,r2*sin(psi[k]*pi/180),r4*sin((phi[k]-180)*pi/180),0],color=col[k])
+    for k in range(n+2):
+        plt.plot([0,r2*np.cos(psi[k]*np.pi/180),r4*np.cos((phi[k]-180)*np.pi/180),1],[0,r2*np.sin(psi[k]*np.pi/180),r4*np.sin((phi[k]-180)*np.pi/180),0],color=col[k%len(col)])
     print('The link lengths are \n Link 1={0:.3f} \n Link 2={1:.3f} \n Link 3={2:.3f} \n Link 4={3:.3f}'.format(r1,r2,r3,r4))
     print('x \t y \t psi \t \t phi')    
     plt.show()
-    for x in range(5):
+    for x in range(n+2):
         print("{0:.3f} \t {1:.3f} \t {2:.3f} \t {3:.3f}".format(xf[x],yf[x],psi[x],phi[x]) )
+    return res
 
 if __name__=="__main__":
     frst('log(x)/log(10)',1,2,3,100,120,240,60)
\ No newline at end of file
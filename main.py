@@ -1,22 +1,38 @@
 import math
-from sympy.abc import x, y
-import sympy as sym
-import sympy.parsing.sympy_parser as parser
+import numpy as np
 import copy
+import time
 
-import plotter
+import candidates
+import engine
+import expressions
+import kinematics
+import profiling
 
 #####################################################
 ##                   Solver Class                  ##
 #####################################################
 class Solver:
+    # Inputs each stage of the synthesis depends on, in pipeline order. A stage also depends on the
+    # inputs of every stage before it, so changing an input invalidates its stage and all later ones
+    # The sweep stage covers the linear maps, angles, Freudenstein solutions and lengths of every candidate
+    STAGE_INPUTS = (("chebyshev_spacing", ("x_min", "x_max", "precision_points")),
+                    ("corresponding_y_points", ("func",)),
+                    ("sweep", ("theta2_start", "theta2_max_rot", "theta4_start", "theta4_max_rot",
+                               "sweep", "sweep_step", "ensure_linkage_validity", "mechanism_types",
+                               "full_range_assembly", "min_transmission_angle")),
+                    ("scores", ("objective", "error_weight", "error_samples")),
+                    ("selection", ("optimise_results", "minimum_range")))
+
     #Class constructor which can take in optional arguments (default to 0)
     #This can be used to construct a default class without needing manual inputs later on
     def __init__(self, func="sin(x)", x_min=math.pi/4, x_max=3*math.pi/4,
                     theta2_start=7*math.pi/12, theta2_max_rot=math.pi/2,
                     theta4_start=4*math.pi/3, theta4_max_rot=math.pi/2,
-                    is_silent=True, do_optimise=False):
-        self.func = parser.parse_expr(func)
+                    is_silent=True, do_optimise=False, engine="numeric",
+                    sweep="loop", sweep_step=5, workers=1, cache=None, profile=False,
+                    precision_points=3, keep_candidates=False, incremental=False):
+        self.func = expressions.target_function(func)  # Target function, an expression compiled once for numpy or a table
         self.x_min = x_min
         self.x_max = x_max
         self.theta2_start   = theta2_start
@@ -24,14 +40,22 @@ class Solver:
         self.theta4_start   = theta4_start
         self.theta4_max_rot = theta4_max_rot
         
-        self.x_points = [0, 0, 0]           # Array to store precision points found given Chebyshev spacing
-        self.y_points = [0, 0, 0]           # Array to store corresponding y-points from above x-points
+        if precision_points < 3:
+            raise ValueError("at least 3 precision points are needed, not %d" % precision_points)
+        if precision_points != 3 and engine != "numeric":
+            raise ValueError("more than 3 precision points requires the numeric engine")
+        self.precision_points = precision_points   # Number of precision points, K values are fitted by least squares above 3
+
+        self.x_points = [0] * precision_points     # Array to store precision points found given Chebyshev spacing
+        self.y_points = [0] * precision_points     # Array to store corresponding y-points from above x-points
+        self.y_min = None                   # Value of the function at the lower x bound
+        self.y_max = None                   # Value of the function at the upper x bound
         
         self.func_theta2 = None
         self.func_theta4 = None
         
-        self.theta2_vals = [0, 0, 0]
-        self.theta4_vals = [0, 0, 0]
+        self.theta2_vals = [0] * precision_points
+        self.theta4_vals = [0] * precision_points
         
         self.fsn_results = [0, 0, 0]        # Array to store 3 freudenstein results, K1, K2 and K3
         
@@ -43,6 +67,70 @@ class Solver:
         self.ensure_linkage_validity = True # Option to ensure starting position of linkage is valid
         self.minimum_range = 3              # The minimum range the answers must have to terminate exeuction early
 
+        # What optimisation minimises: the range of the lengths ("range"), the structural error of the
+        # output against the target function ("error"), or the range plus error_weight times the error
+        # ("combined"). minimum_range then applies to that score
+        self.objective = "range"
+        self.error_weight = 1.0
+        self.error_samples = 101            # Number of x values the structural error is measured at
+
+        # Limits on the kind of linkage accepted, checked for every candidate before it is scored
+        self.mechanism_types = None         # Names from kinematics.MECHANISM_TYPES that are accepted, any if None
+        self.full_range_assembly = False    # Option to reject linkages that cannot assemble over the whole input rotation
+        self.min_transmission_angle = None  # Smallest transmission angle accepted over the input rotation, in radians
+
+        if engine not in ("numeric", "sympy"):
+            raise ValueError("engine must be either 'numeric' or 'sympy', not %r" % (engine,))
+        self.engine = engine                # Solve Freudenstein numerically, or symbolically with sympy
+
+        if sweep not in ("loop", "grid", "adaptive", "anytime"):
+            raise ValueError("sweep must be one of 'loop', 'grid', 'adaptive' or 'anytime', not %r" % (sweep,))
+        if sweep != "loop" and engine != "numeric":
+            raise ValueError("the %s sweep requires the numeric engine" % sweep)
+        self.sweep = sweep                  # Search start angles one at a time (loop), all at once (grid), coarse to fine (adaptive) or within a budget (anytime)
+        self.sweep_step = sweep_step        # Step in degrees between the start angles searched
+        self.workers = workers              # Number of processes the grid sweep is split across
+
+        self.result_cache = cache           # Optional cache.ResultCache of previously found linkages
+        self.from_cache = False             # Whether the last linkage found came from the cache
+
+        # Keep every candidate a numeric sweep evaluates in candidates, a candidates.CandidateStore
+        # A path keeps them in a memory-mapped .npy file there rather than in memory
+        if keep_candidates and sweep == "loop":
+            raise ValueError("keeping candidates requires the grid or adaptive sweep")
+        self.keep_candidates = keep_candidates
+        self.candidates = None
+
+        # Re-solving only reruns the stages whose inputs changed since the last solve, keeping every
+        # candidate of the grid so a change to the selection alone just picks again from them
+        if incremental and sweep != "grid":
+            raise ValueError("incremental solving requires the grid sweep")
+        self.incremental = incremental
+        self.stage_keys = {}                # Stage name -> inputs it last ran with
+        self.sweep_results = None           # candidates.CandidateStore of the whole grid last swept
+        self.sweep_origin = None            # Start angles the last sweep began at, and the ones it chose
+
+        # Optional timing of each stage and counts of candidates, as a profiling.SolverStats
+        self.stats = profiling.SolverStats() if profile else None
+
+        # Options for the adaptive sweep, which only refines when optimising
+        self.adaptive_coarse_step = 5       # Step in degrees of the first, full sweep
+        self.adaptive_refine_cells = 16     # Number of most promising cells refined at each level
+        self.adaptive_refine_factor = 4     # Each level divides the step by this much
+        self.adaptive_precision = 0.1       # Stop refining once the step in degrees is below this
+        self.adaptive_polish = True         # Finish with a local Nelder-Mead search from the best candidate
+        self.search_report = None           # Evaluations and final precision of the last adaptive or anytime sweep
+
+        # Options for the anytime sweep, which always optimises and returns the best design found in its budget
+        self.time_budget = None             # Seconds the search may take, unlimited if None
+        self.evaluation_budget = None       # Candidates the search may evaluate, unlimited if None
+        self.target_score = None            # Stop once a design scores below this, use the whole budget if None
+        self.progress = None                # Function called with each better design as it is found
+
+        # Options for long grid sweeps, which can save their progress and carry on after being interrupted
+        self.checkpoint = None              # Path of a file the grid sweep saves each finished tile to, if any
+        self.tile_rows = 64                 # Number of theta2 start angles in each tile
+
     #reads input from the user to use as parameters for calculations and output
     #function blocks until a valid input is given
     def read_user_input(self) -> None:
@@ -58,7 +146,7 @@ class Solver:
         while (True):
             function_input = input("Enter the function. Please note, you MUST include all multiplications using the * symbol, and do not include y=\n")
             try:
-                self.func = parser.parse_expr(function_input)
+                self.func = expressions.compile_expression(function_input)
                 break
             except:
                 print("Error, your equation was invalid. Did you forget to remove the = sign, or include all the *?\n")
@@ -171,24 +259,85 @@ class Solver:
 
     #uses the previously set field variables to executing calculations and determine the corresponding 4bar linkage
     def execute_4bar_calculations(self) -> None:
+        optimal_lengths = self.find_optimal_linkage()
+
+        print("Final Linkage dimensions calculated as follows:")
+        print("R1 = %.3f\nR2 = %.3f\nR3 = %.3f\nR4 = %.3f" % tuple(optimal_lengths))
+        print()            
+        pass
+
+    #determines the corresponding 4bar linkage without printing the final result, returning its lengths
+    #all lengths are 0 if no valid linkage was found
+    @profiling.timed_stage("find_optimal_linkage")
+    def find_optimal_linkage(self) -> list:
+        self.find_precision_points()
+
+        #reuse the linkage found last time this exact design was solved, unless the candidates are wanted too
+        #anytime results depend on the budget and how fast this machine is, so they are never cached
+        self.from_cache = False
+        self.candidates = None
+        if (self.result_cache is not None and self.sweep != "anytime"):
+            key = self.result_cache.key_for(self)
+            cached = None if self.keep_candidates else self.result_cache.get(key)
+            if (cached is not None):
+                self.from_cache = True
+                if any(cached["lengths"]):
+                    self.adopt_linkage(cached["theta2_start"], cached["theta4_start"], cached["fsn_results"], cached["lengths"])
+                else:
+                    self.lengths = [0, 0, 0, 0]
+                return copy.deepcopy(self.lengths)
+
+        if (self.incremental):
+            optimal_lengths = self.incremental_sweep()
+        elif (self.sweep == "grid"):
+            optimal_lengths = self.grid_sweep()
+        elif (self.sweep == "adaptive"):
+            optimal_lengths = self.adaptive_sweep()
+        elif (self.sweep == "anytime"):
+            optimal_lengths = self.anytime_sweep()
+        else:
+            optimal_lengths = self.loop_sweep()
+        if (self.candidates is not None):
+            self.candidates.finish()
+
+        if (self.result_cache is not None and self.sweep != "anytime"):
+            self.result_cache.put(key, {"lengths": [float(length) for length in optimal_lengths],
+                                        "theta2_start": self.theta2_start, "theta4_start": self.theta4_start,
+                                        "fsn_results": [float(k) for k in self.fsn_results]})
+        return optimal_lengths
+
+    #works out the precision points and their y values, unless they are still up to date
+    def find_precision_points(self) -> None:
 
         #These calculations only need to be done once
-        self.find_chebyshev_spacing()
-        self.find_corresponding_y_points()
+        if self.stage_changed("chebyshev_spacing"):
+            self.find_chebyshev_spacing()
+            self.stage_done("chebyshev_spacing")
+        if self.stage_changed("corresponding_y_points"):
+            self.find_corresponding_y_points()
+            self.stage_done("corresponding_y_points")
+        pass
+
+    #loops through every pair of start angles one at a time, keeping the best linkage found
+    #leaves the solver holding the chosen start angles and lengths, and returns the lengths
+    @profiling.timed_stage("loop_sweep")
+    def loop_sweep(self) -> list:
 
         #loop through starting theta 2 angle to start + 360
         start_angle_2 = self.theta2_start
         current_range = math.inf
         optimal_lengths = [0, 0, 0, 0]
+        optimal_starts = (start_angle_2, self.theta4_start)
         finished_early = False
+        limits = self.limits()
 
         start_angle_4 = self.theta4_start
-        for x in range(0, 360, 5):
+        for x in np.arange(0, 360, self.sweep_step):
             self.theta2_start = start_angle_2 + math.radians(x)
             
             #loop through starting theta 4 angle to start + 360
             
-            for y in range(0, 360, 5):
+            for y in np.arange(0, 360, self.sweep_step):
                 self.theta4_start = start_angle_4 + math.radians(y)
 
                 self.linear_mapping_x_to_theta2()
@@ -197,10 +346,10 @@ class Solver:
                 self.solve_freudenstein()
                 self.solve_linkage_dimensions()
 
-                #check if all values are positive
+                #check if all values are positive, degenerate systems give nan lengths
                 found_negative = False    
                 for length in self.lengths:
-                    if (length < 0):
+                    if (length < 0 or math.isnan(length)):
                         found_negative = True
                  
                 # Check linkage dimensions form valid 4-bar linkage in starting angle
@@ -209,21 +358,27 @@ class Solver:
                     diagonal = math.sqrt(self.lengths[0]**2 + self.lengths[1]**2 - 2*self.lengths[0]*self.lengths[1]*math.cos(self.theta2_start))        # using cosine rule                 
                     valid_linkage = (diagonal + self.lengths[3]) > self.lengths[2]
                     
+                checks = engine.limit_checks([float(length) for length in self.lengths], self.theta2_start,
+                                             self.theta2_max_rot, limits)
+                self.count_candidates(engine.rejection_counts(np.array(not found_negative), np.array(valid_linkage), checks))
+
                 #This solution has all positive lengths so we consider it
-                if (not found_negative and valid_linkage):
+                if (not found_negative and valid_linkage and all(checks.values())):
                     
                     #check to see if we should be trying to optimise results
                     if (self.optimise_results):
                         #check to see if its better than what we have
-                        biggest_val = max(self.lengths)
-                        smallest_val = min(self.lengths)
-
-                        new_range = biggest_val - smallest_val
+                        if (self.objective == "range"):
+                            new_range = max(self.lengths) - min(self.lengths)
+                        else:
+                            new_range = float(engine.candidate_scores(np.array(self.lengths), True, self.theta2_start, self.theta4_start,
+                                                                      self.theta2_max_rot, self.theta4_max_rot, self.scoring()))
 
                         #our result has a smaller range, so its better
                         if new_range < current_range:
-                            current_range = biggest_val
+                            current_range = new_range
                             optimal_lengths = copy.deepcopy(self.lengths)
+                            optimal_starts = (self.theta2_start, self.theta4_start)
                             
                             #check if we are below minimum range, if so we should stop
                             if (current_range < self.minimum_range):
@@ -232,22 +387,412 @@ class Solver:
 
                     else:
                         optimal_lengths = copy.deepcopy(self.lengths)
+                        optimal_starts = (self.theta2_start, self.theta4_start)
                         finished_early = True
                         break
             
             if (finished_early):
                 break
 
-        print("Final Linkage dimensions calculated as follows:")
-        print("R1 = %.3f\nR2 = %.3f\nR3 = %.3f\nR4 = %.3f" % tuple(optimal_lengths))
-        print()            
+        self.theta2_start, self.theta4_start = optimal_starts
+        self.lengths = optimal_lengths
+        return optimal_lengths
+
+    #evaluates every pair of start angles at once with numpy, in blocks of theta2 rows to bound memory
+    #picks the same linkage as loop_sweep would, and leaves the solver holding the chosen start angles and lengths
+    #the rows can be split across several worker processes, which always give the same result as one
+    #with a checkpoint path, the rows are swept in tiles saved as they finish, and a rerun carries on from the last
+    @profiling.timed_stage("grid_sweep")
+    def grid_sweep(self) -> list:
+        offsets = np.radians(np.arange(0, 360, self.sweep_step))
+        theta2_starts = self.theta2_start + offsets
+        theta4_starts = self.theta4_start + offsets
+
+        theta2_fractions, theta4_fractions = self.precision_fractions()
+        arguments = (theta4_starts, theta2_fractions, theta4_fractions, self.theta2_max_rot, self.theta4_max_rot,
+                     self.ensure_linkage_validity, self.optimise_results, self.minimum_range, self.scoring(),
+                     self.limits())
+
+        if (self.keep_candidates and self.checkpoint is not None):
+            raise ValueError("a checkpointed sweep cannot keep its candidates, as a resumed one skips the tiles already done")
+        if (self.keep_candidates):
+            #the candidates are recorded as they are evaluated, which needs them all in this process
+            self.candidates = self.new_candidate_store(len(theta2_starts) * len(theta4_starts))
+            best, counts = engine.sweep_rows(0, theta2_starts, *arguments, record=self.candidates.append)
+        elif (self.checkpoint is not None):
+            best, counts, resumed = engine.checkpointed_sweep_rows(self.checkpoint, theta2_starts, *arguments,
+                                                                   tile_rows=self.tile_rows, workers=self.workers)
+            self.search_report = {"tiles": math.ceil(len(theta2_starts) / self.tile_rows), "resumed": resumed}
+        elif (self.workers > 1):
+            best, counts = engine.parallel_sweep_rows(theta2_starts, *arguments, workers=self.workers)
+        else:
+            best, counts = engine.sweep_rows(0, theta2_starts, *arguments)
+        self.count_candidates(counts)
+
+        if best is None:
+            self.lengths = [0, 0, 0, 0]
+            return self.lengths
+
+        self.adopt_linkage(theta2_starts[best["row"]], theta4_starts[best["column"]], best["k_vals"], best["lengths"])
+        return copy.deepcopy(self.lengths)
+
+    #the grid sweep done in stages: every candidate of the grid is evaluated and kept, then scored, then one
+    #is selected, and only the stages whose inputs changed since the last call are rerun
+    #picks the same linkage as grid_sweep, and leaves the solver holding the chosen start angles and lengths
+    @profiling.timed_stage("incremental_sweep")
+    def incremental_sweep(self) -> list:
+        theta2_origin, theta4_origin = self.sweep_start_angles()
+
+        if self.stage_changed("sweep"):
+            offsets = np.radians(np.arange(0, 360, self.sweep_step))
+            theta2_starts = theta2_origin + offsets
+            theta4_starts = theta4_origin + offsets
+            theta2_fractions, theta4_fractions = self.precision_fractions()
+
+            #nothing is below a range of -inf, so every candidate is evaluated without stopping early
+            store = self.new_candidate_store(len(theta2_starts) * len(theta4_starts))
+            _, counts = engine.sweep_rows(0, theta2_starts, theta4_starts, theta2_fractions, theta4_fractions,
+                                          self.theta2_max_rot, self.theta4_max_rot, self.ensure_linkage_validity,
+                                          True, -math.inf, self.scoring(), self.limits(), record=store.append)
+            store.finish()
+            self.count_candidates(counts)
+            self.sweep_results = store
+            self.stage_done("sweep")
+            self.stage_done("scores")
+
+        data = self.sweep_results[:]
+        lengths = np.stack([data["r1"], data["r2"], data["r3"], data["r4"]], axis=-1)
+        feasible = data["non_negative"] & data["assembles"] & data["within_limits"]
+        if self.stage_changed("scores"):
+            data["score"] = engine.candidate_scores(lengths, feasible, data["theta2_start"], data["theta4_start"],
+                                                    self.theta2_max_rot, self.theta4_max_rot, self.scoring())
+            self.stage_done("scores")
+
+        index, _ = engine.select_candidate(data["score"], feasible, self.optimise_results, self.minimum_range)
+        if index is None:
+            self.lengths = [0, 0, 0, 0]
+            self.theta2_start, self.theta4_start = theta2_origin, theta4_origin
+        else:
+            self.adopt_linkage(data["theta2_start"][index], data["theta4_start"][index],
+                               [data["k1"][index], data["k2"][index], data["k3"][index]], lengths[index])
+        if (self.keep_candidates):
+            self.candidates = self.sweep_results
+        self.sweep_origin = (theta2_origin, theta4_origin, self.theta2_start, self.theta4_start)
+        self.stage_done("selection")
+        return copy.deepcopy(self.lengths)
+
+    #start angles a sweep begins at. A sweep leaves the solver holding the start angles it chose, so while
+    #they are unchanged the sweep is taken to still begin where the last one did
+    def sweep_start_angles(self) -> tuple:
+        if (self.sweep_origin is not None and (self.theta2_start, self.theta4_start) == self.sweep_origin[2:]):
+            return self.sweep_origin[:2]
+        return self.theta2_start, self.theta4_start
+
+    #the values of every input a stage depends on, including those of the stages before it
+    def stage_key(self, stage) -> tuple:
+        key = []
+        for name, inputs in self.STAGE_INPUTS:
+            for field in inputs:
+                if field == "func":
+                    key.append(self.func.source)
+                elif field in ("theta2_start", "theta4_start"):
+                    key.append(self.sweep_start_angles()[field == "theta4_start"])
+                else:
+                    key.append(getattr(self, field))
+            if name == stage:
+                return tuple(key)
+        raise ValueError("unknown stage %r" % (stage,))
+
+    #whether a stage has to run, always when not solving incrementally
+    def stage_changed(self, stage) -> bool:
+        return not self.incremental or self.stage_keys.get(stage) != self.stage_key(stage)
+
+    #records the inputs a stage has just run with
+    def stage_done(self, stage) -> None:
+        self.stage_keys[stage] = self.stage_key(stage)
         pass
+
+    #forgets every stage run, so the next solve starts again from the Chebyshev spacing
+    def invalidate(self) -> None:
+        self.stage_keys.clear()
+        self.sweep_results = None
+        self.sweep_origin = None
+        pass
+
+    #searches a coarse grid, then repeatedly refines the most promising cells with a finer grid around them
+    #finally polishes the best candidate with a local continuous search, the work done is kept in search_report
+    @profiling.timed_stage("adaptive_sweep")
+    def adaptive_sweep(self) -> list:
+        if (not self.optimise_results):
+            #without optimisation the first valid linkage is wanted, so a plain coarse sweep is enough
+            step, self.sweep_step = self.sweep_step, self.adaptive_coarse_step
+            try:
+                return self.grid_sweep()
+            finally:
+                self.sweep_step = step
+
+        if (self.keep_candidates):
+            self.candidates = self.new_candidate_store()
+        step = self.adaptive_coarse_step
+        offsets = np.radians(np.arange(0, 360, step))
+        theta2_starts, theta4_starts = np.meshgrid(self.theta2_start + offsets, self.theta4_start + offsets, indexing="ij")
+        theta2_starts, theta4_starts = theta2_starts.ravel(), theta4_starts.ravel()
+        evaluations = 0
+
+        while True:
+            k_vals, lengths, feasible, scores = self.evaluate_start_angles(theta2_starts, theta4_starts)
+            evaluations += len(scores)
+            scores = np.where(feasible, scores, np.inf)
+
+            order = np.argsort(scores, kind="stable")
+            best = order[0]
+            if (step <= self.adaptive_precision or not np.isfinite(scores[best]) or scores[best] < self.minimum_range):
+                break
+
+            #refine a finer grid spanning each of the most promising cells, skipping cells next to one
+            #already chosen so the refinement explores separate regions rather than one neighbourhood
+            cells = []
+            for index in order:
+                if (len(cells) == self.adaptive_refine_cells or not np.isfinite(scores[index])):
+                    break
+                separation = np.maximum(np.abs(theta2_starts[cells] - theta2_starts[index]),
+                                        np.abs(theta4_starts[cells] - theta4_starts[index]))
+                if np.all(separation > 1.5 * math.radians(step)):
+                    cells.append(index)
+            cells = np.array(cells, dtype=int)
+            local = np.radians(np.arange(-self.adaptive_refine_factor, self.adaptive_refine_factor + 1) * step / self.adaptive_refine_factor)
+            local2, local4 = np.meshgrid(local, local, indexing="ij")
+            theta2_starts = (theta2_starts[cells, None] + local2.ravel()).ravel()
+            theta4_starts = (theta4_starts[cells, None] + local4.ravel()).ravel()
+            step = step / self.adaptive_refine_factor
+
+        if not np.isfinite(scores[best]):
+            self.lengths = [0, 0, 0, 0]
+            self.search_report = {"evaluations": evaluations, "precision": step, "score": math.inf, "polished": False}
+            return self.lengths
+
+        best = (theta2_starts[best], theta4_starts[best], k_vals[best], lengths[best])
+        best_score = scores[order[0]]
+        polished = False
+
+        if (self.adaptive_polish and best_score >= self.minimum_range):
+            import scipy.optimize
+
+            def objective(starts):
+                _, _, feasible, scores = self.evaluate_start_angles(starts[0], starts[1])
+                return float(scores) if feasible else math.inf
+
+            result = scipy.optimize.minimize(objective, [best[0], best[1]], method="Nelder-Mead",
+                                             options={"xatol": math.radians(step) / 10, "fatol": 1e-12,
+                                                      "initial_simplex": [[best[0], best[1]],
+                                                                          [best[0] + math.radians(step), best[1]],
+                                                                          [best[0], best[1] + math.radians(step)]]})
+            evaluations += result.nfev
+            if result.fun < best_score:
+                k_vals, lengths, _, _ = self.evaluate_start_angles(result.x[0], result.x[1])
+                evaluations += 1
+                best = (result.x[0], result.x[1], k_vals, lengths)
+                best_score = result.fun
+                step = step / 10
+                polished = True
+
+        self.adopt_linkage(*best)
+        self.search_report = {"evaluations": evaluations, "precision": step, "score": float(best_score), "polished": polished}
+        return copy.deepcopy(self.lengths)
+
+    #runs anytime_designs within time_budget and evaluation_budget, passing each better design to progress
+    #leaves the solver holding the best start angles and lengths found, and returns the lengths
+    @profiling.timed_stage("anytime_sweep")
+    def anytime_sweep(self) -> list:
+        self.lengths = [0, 0, 0, 0]
+        for design in self.anytime_designs(self.time_budget, self.evaluation_budget, self.target_score):
+            if (self.progress is not None):
+                self.progress(design)
+        return copy.deepcopy(self.lengths)
+
+    #searches the grid of start angles at sweep_step from coarse to fine, yielding each better design as it
+    #is found until the grid is done, a budget runs out or a score below target_score is found
+    #minimum_range is not used, as its default would stop almost every search straight away
+    #each level halves the step, and visits its new points in order of the score of the coarser point they
+    #refine, so the neighbourhoods of good designs are searched first. The solver always holds the best
+    #design so far, so a caller can stop iterating at any time. The final report is kept in search_report
+    def anytime_designs(self, time_budget=None, evaluation_budget=None, target_score=None, batch_size=4096):
+        start = time.perf_counter()
+        self.find_precision_points()
+        origin2, origin4 = self.theta2_start, self.theta4_start
+        offsets = np.radians(np.arange(0, 360, self.sweep_step))
+        count = len(offsets)
+        scores = np.full((count, count), np.nan)        # score of every grid point visited, inf if infeasible
+        if (self.keep_candidates):
+            self.candidates = self.new_candidate_store()
+
+        stride = 1
+        while (stride * 2 <= count // 4):
+            stride *= 2
+        best_score = math.inf
+        evaluations = 0
+        precision = None
+        stopped = "complete"
+
+        while stride >= 1 and stopped == "complete":
+            rows, columns = np.meshgrid(np.arange(0, count, stride), np.arange(0, count, stride), indexing="ij")
+            new = np.isnan(scores[rows, columns])
+            rows, columns = rows[new], columns[new]
+            parents = scores[(rows // (2*stride)) * (2*stride), (columns // (2*stride)) * (2*stride)]
+            order = np.argsort(np.where(np.isnan(parents), np.inf, parents), kind="stable")
+            rows, columns = rows[order], columns[order]
+
+            for first in range(0, len(rows), batch_size):
+                if (time_budget is not None and time.perf_counter() - start >= time_budget):
+                    stopped = "time_budget"
+                elif (evaluation_budget is not None and evaluations >= evaluation_budget):
+                    stopped = "evaluation_budget"
+                elif (target_score is not None and best_score < target_score):
+                    stopped = "target_score"
+                if (stopped != "complete"):
+                    break
+
+                last = first + batch_size
+                if (evaluation_budget is not None):
+                    last = min(last, first + evaluation_budget - evaluations)
+                batch_rows, batch_columns = rows[first:last], columns[first:last]
+                theta2_starts, theta4_starts = origin2 + offsets[batch_rows], origin4 + offsets[batch_columns]
+                k_vals, lengths, feasible, batch_scores = self.evaluate_start_angles(theta2_starts, theta4_starts)
+                batch_scores = np.where(feasible, batch_scores, np.inf)
+                scores[batch_rows, batch_columns] = batch_scores
+                evaluations += len(batch_rows)
+
+                index = int(np.argmin(batch_scores))
+                if (batch_scores[index] < best_score):
+                    best_score = float(batch_scores[index])
+                    self.adopt_linkage(theta2_starts[index], theta4_starts[index], k_vals[index], lengths[index])
+                    yield {"lengths": copy.deepcopy(self.lengths), "theta2_start": self.theta2_start,
+                           "theta4_start": self.theta4_start, "score": best_score, "evaluations": evaluations,
+                           "coverage": evaluations / count**2, "elapsed": time.perf_counter() - start}
+            else:
+                precision = stride * self.sweep_step
+            stride //= 2
+
+        if (best_score == math.inf):
+            self.theta2_start, self.theta4_start = origin2, origin4
+        self.search_report = {"evaluations": evaluations, "coverage": evaluations / count**2,
+                              "precision": precision, "score": best_score, "stopped": stopped,
+                              "elapsed": time.perf_counter() - start}
+
+    #runs the numeric synthesis for arrays of start angles, returning K values, lengths, feasibility and the
+    #score optimisation minimises, which is the range of the lengths unless another objective is chosen
+    def evaluate_start_angles(self, theta2_starts, theta4_starts) -> tuple:
+        theta2_fractions, theta4_fractions = self.precision_fractions()
+        k_vals, lengths = engine.evaluate_candidates(theta2_starts, theta4_starts,
+                                                     theta2_fractions, theta4_fractions,
+                                                     self.theta2_max_rot, self.theta4_max_rot)
+        non_negative, assembles = engine.candidate_checks(lengths, theta2_starts, self.ensure_linkage_validity)
+        checks = engine.limit_checks(lengths, theta2_starts, self.theta2_max_rot, self.limits())
+        self.count_candidates(engine.rejection_counts(non_negative, assembles, checks))
+        within = engine.within_limits(checks, non_negative)
+        feasible = non_negative & assembles & within
+        scores = engine.candidate_scores(lengths, feasible, theta2_starts, theta4_starts,
+                                         self.theta2_max_rot, self.theta4_max_rot, self.scoring())
+        if (self.candidates is not None):
+            self.candidates.append(theta2_starts, theta4_starts, k_vals, lengths, non_negative, assembles, scores, within)
+        return k_vals, lengths, feasible, scores
+
+    #an empty store for the candidates of a sweep, memory-mapped when keep_candidates is a path and the
+    #number of candidates is known in advance
+    def new_candidate_store(self, capacity=None):
+        path = self.keep_candidates if isinstance(self.keep_candidates, str) else None
+        return candidates.CandidateStore(path=path, capacity=capacity)
+
+    #the limits on the kind of linkage accepted, as engine.limit_checks takes them, or None if there are none
+    def limits(self):
+        if (self.mechanism_types is None and not self.full_range_assembly and self.min_transmission_angle is None):
+            return None
+        types = None
+        if (self.mechanism_types is not None):
+            unknown = set(self.mechanism_types) - set(kinematics.MECHANISM_TYPES)
+            if unknown:
+                raise ValueError("unknown mechanism types %s, expected some of %s"
+                                 % (", ".join(sorted(unknown)), ", ".join(kinematics.MECHANISM_TYPES)))
+            types = sorted(kinematics.MECHANISM_TYPES.index(name) for name in self.mechanism_types)
+        return {"mechanism_types": types, "full_range": bool(self.full_range_assembly),
+                "min_transmission_angle": self.min_transmission_angle}
+
+    #how optimisation scores candidates, as engine.candidate_scores takes it
+    #returns None when optimising the range of the lengths alone, as no samples of the target are needed
+    def scoring(self):
+        if self.objective not in ("range", "error", "combined"):
+            raise ValueError("objective must be one of 'range', 'error' or 'combined', not %r" % (self.objective,))
+        if (self.objective == "range"):
+            return None
+        return dict(self.target_samples(), objective=self.objective, error_weight=self.error_weight)
+
+    #dense samples of the target function as fractions of its x and y ranges, which the structural error
+    #is measured at, and the y difference one radian of output angle corresponds to
+    def target_samples(self) -> dict:
+        #the samples end exactly on the bounds, so a table covering just the x range can be sampled
+        x_vals = np.linspace(self.x_min, self.x_max, self.error_samples)
+        y_vals = self.func(x_vals)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_fractions = (x_vals - self.x_min) / (self.x_max - self.x_min)
+            y_fractions = (y_vals - self.y_min) / (self.y_max - self.y_min)
+        return {"x_fractions": x_fractions, "y_fractions": y_fractions,
+                "y_per_radian": abs(self.y_max - self.y_min) / abs(self.theta4_max_rot)}
+
+    #max and RMS structural error of the current linkage, the difference in y between the function it
+    #generates and the target function over the whole x range (infinite if it cannot move through it all)
+    def structural_error(self) -> dict:
+        samples = self.target_samples()
+        max_error, rms_error = engine.structural_errors(np.array(self.lengths, dtype=float), self.theta2_start, self.theta4_start,
+                                                        samples["x_fractions"], samples["y_fractions"],
+                                                        self.theta2_max_rot, self.theta4_max_rot)
+        return {"max": float(max_error) * samples["y_per_radian"], "rms": float(rms_error) * samples["y_per_radian"]}
+
+    #adds counts of candidates evaluated and rejected to the stats, when profiling
+    def count_candidates(self, counts) -> None:
+        if (self.stats is not None):
+            for name, amount in counts.items():
+                self.stats.count(name, amount)
+        pass
+
+    #monte carlo estimate of how manufacturing tolerances spread the error of the current linkage, see tolerance.analyse
+    def tolerance_analysis(self, **kwargs) -> dict:
+        import tolerance
+        return tolerance.analyse(self, **kwargs)
+
+    #returns the timing of each stage and the candidate counts as a dictionary, or None when not profiling
+    def get_stats(self):
+        return None if self.stats is None else self.stats.as_dict()
+
+    #leaves the solver holding the state of a linkage chosen by a numeric sweep, as the loop sweep does
+    def adopt_linkage(self, theta2_start, theta4_start, k_vals, lengths) -> None:
+        theta2_fractions, theta4_fractions = self.precision_fractions()
+        theta2_vals, theta4_vals = engine.map_precision_angles(theta2_start, theta4_start,
+                                                               theta2_fractions, theta4_fractions,
+                                                               self.theta2_max_rot, self.theta4_max_rot)
+        self.theta2_start, self.theta4_start = float(theta2_start), float(theta4_start)
+        self.linear_mapping_x_to_theta2()
+        self.linear_mapping_y_to_theta4()
+        self.theta2_vals = theta2_vals.tolist()
+        self.theta4_vals = theta4_vals.tolist()
+        self.fsn_results = np.asarray(k_vals).tolist()
+        self.lengths = np.asarray(lengths).tolist()
+
+    #where each precision point sits between the lower and upper bounds, used to map them onto angles
+    def precision_fractions(self) -> tuple:
+        x_points = np.array(self.x_points, dtype=float)
+        y_points = np.array(self.y_points, dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            theta2_fractions = (x_points - self.x_min) / (self.x_max - self.x_min)
+            theta4_fractions = (y_points - self.y_min) / (self.y_max - self.y_min)
+        return theta2_fractions, theta4_fractions
         
-    # Applies Chebyshev spacing formula to determine 3 precision points
+    # Applies Chebyshev spacing formula to determine the precision points
+    @profiling.timed_stage("find_chebyshev_spacing")
     def find_chebyshev_spacing(self) -> None:
-        n = 3
+        n = self.precision_points
                 
-        for j in range(3, 0, -1):   # Counts backwards in sequence 3, 2, 1
+        for j in range(n, 0, -1):   # Counts backwards in sequence n, ..., 2, 1
             cos_term = math.cos((2*j - 1) * math.pi / (2*n))
             first_term = 0.5 * (self.x_max + self.x_min)
             second_term = 0.5 * (self.x_max - self.x_min) * cos_term
@@ -257,81 +802,83 @@ class Solver:
         if self.silent_flag is False:
             print("Given lower bound of x0 = %f, and upper bound of x4 = %f" % (self.x_min, self.x_max))
             print("Following precision points found:")
-            print("x1=%.3f, x2=%.3f, x3=%.3f" % tuple(self.x_points[0:3]))
+            print(", ".join("x%d=%.3f" % (i + 1, x_val) for i, x_val in enumerate(self.x_points)))
             print()
         pass
     
     # Substitutes x points into the mathematic function to determine corresponding y points
+    # Also evaluates the function at the x bounds, which the linear mapping to theta4 needs
+    @profiling.timed_stage("find_corresponding_y_points")
     def find_corresponding_y_points(self) -> None:        
-        for i in range(0, 3):
-            x_val = self.x_points[i]
-            self.y_points[i] = self.func.subs(x, x_val)
+        self.y_points = self.func(self.x_points).tolist()
+        self.y_min, self.y_max = self.func([self.x_min, self.x_max]).tolist()
 
         if self.silent_flag is False: 
             print("Following corresponding y-points found:")
-            print("y1=%.3f, y2=%.3f, y3=%.3f" % tuple(self.y_points[0:3]))
+            print(", ".join("y%d=%.3f" % (i + 1, y_val) for i, y_val in enumerate(self.y_points)))
             print()
         pass
     
     # Linearly maps the x values to theta2 angles
+    @profiling.timed_stage("linear_mapping_x_to_theta2")
     def linear_mapping_x_to_theta2(self) -> None:
-        a, b = sym.symbols("a, b")
         angle1 = self.theta2_start
         angle2 = self.theta2_start + self.theta2_max_rot
         
-        eq1 = sym.Eq(a*self.x_min + b, angle1)
-        eq2 = sym.Eq(a*self.x_max + b, angle2)
-        result = sym.solve([eq1, eq2], (a, b))
-        self.func_theta2 = sym.lambdify(x, x*result[a] + result[b])
+        a, b = engine.linear_map(self.x_min, self.x_max, angle1, angle2)
+        self.func_theta2 = lambda x_val: a*x_val + b
         
         if self.silent_flag is False:
             print("Linearly mapped x to theta2 (truncated values):")
-            print("Theta2 = %.3f * x + %.3f" % (result[a], result[b]))
+            print("Theta2 = %.3f * x + %.3f" % (a, b))
             print()
         pass
     
     # Linearly maps the y values to theta4 angles
+    @profiling.timed_stage("linear_mapping_y_to_theta4")
     def linear_mapping_y_to_theta4(self) -> None:
-        c, d = sym.symbols("c,d")
         angle1 = self.theta4_start
         angle2 = self.theta4_start + self.theta4_max_rot
-        y_min = self.func.subs(x, self.x_min)
-        y_max = self.func.subs(x, self.x_max)
         
-        eq1 = sym.Eq(c*y_min + d, angle1)
-        eq2 = sym.Eq(c*y_max + d, angle2)
-        result = sym.solve([eq1, eq2], (c, d))
-        self.func_theta4 = sym.lambdify(y, y*result[c] + result[d])
+        c, d = engine.linear_map(self.y_min, self.y_max, angle1, angle2)
+        self.func_theta4 = lambda y_val: c*y_val + d
         
         if self.silent_flag is False:
             print("Linearly mapped y to theta4 (truncated values):")
-            print("Theta4 = %.3f * y + %.3f" % (result[c], result[d]))
+            print("Theta4 = %.3f * y + %.3f" % (c, d))
             print()
         pass
     
     # Uses the linear mapping functions to determine values of theta2 and theta4
+    @profiling.timed_stage("determine_corresponding_angles")
     def determine_corresponding_angles(self) -> None:
-        for i in range(3):
+        for i in range(self.precision_points):
             self.theta2_vals[i] = self.func_theta2(self.x_points[i])
             self.theta4_vals[i] = self.func_theta4(self.y_points[i])
         
         if self.silent_flag is False:
             print("Linearly mapped theta values determined:")
-            print("Theta2 values: %.3f, %.3f, %.3f" % tuple(self.theta2_vals))
-            print("Theta4 values: %.3f, %.3f, %.3f" % tuple(self.theta4_vals))
+            print("Theta2 values: " + ", ".join("%.3f" % angle for angle in self.theta2_vals))
+            print("Theta4 values: " + ", ".join("%.3f" % angle for angle in self.theta4_vals))
             print()
         pass
     
     # Solves the freudenstein equation to determine the 3 K values
+    # Singular systems give nan K values when using the numeric engine
+    @profiling.timed_stage("solve_freudenstein")
     def solve_freudenstein(self) -> None:
-        a,b,c = sym.symbols('a, b, c')
-        eq1 = sym.Eq(a*sym.cos(self.theta2_vals[0]) + b*sym.cos(self.theta4_vals[0]) + c, sym.cos(self.theta2_vals[0] - self.theta4_vals[0]))
-        eq2 = sym.Eq(a*sym.cos(self.theta2_vals[1]) + b*sym.cos(self.theta4_vals[1]) + c, sym.cos(self.theta2_vals[1] - self.theta4_vals[1]))
-        eq3 = sym.Eq(a*sym.cos(self.theta2_vals[2]) + b*sym.cos(self.theta4_vals[2]) + c, sym.cos(self.theta2_vals[2] - self.theta4_vals[2]))
-        result = sym.solve([eq1, eq2, eq3], (a, b, c), real=True)
-        self.fsn_results[0] = result[a]
-        self.fsn_results[1] = result[b]
-        self.fsn_results[2] = result[c]
+        if self.engine == "numeric":
+            self.fsn_results = engine.solve_freudenstein(self.theta2_vals, self.theta4_vals).tolist()
+        else:
+            import sympy as sym
+            a,b,c = sym.symbols('a, b, c')
+            eq1 = sym.Eq(a*sym.cos(self.theta2_vals[0]) + b*sym.cos(self.theta4_vals[0]) + c, sym.cos(self.theta2_vals[0] - self.theta4_vals[0]))
+            eq2 = sym.Eq(a*sym.cos(self.theta2_vals[1]) + b*sym.cos(self.theta4_vals[1]) + c, sym.cos(self.theta2_vals[1] - self.theta4_vals[1]))
+            eq3 = sym.Eq(a*sym.cos(self.theta2_vals[2]) + b*sym.cos(self.theta4_vals[2]) + c, sym.cos(self.theta2_vals[2] - self.theta4_vals[2]))
+            result = sym.solve([eq1, eq2, eq3], (a, b, c), real=True)
+            self.fsn_results[0] = result[a]
+            self.fsn_results[1] = result[b]
+            self.fsn_results[2] = result[c]
 
         if self.silent_flag is False:
             print("Freudenstein calculates K1 as %.3f, K2 as %.3F and K3 as %.3f" % tuple(self.fsn_results))
@@ -339,16 +886,22 @@ class Solver:
         pass
     
     # Solves for the dimensions of all linkages, assuming R1 = 1m
+    # Degenerate K values give nan lengths when using the numeric engine
+    @profiling.timed_stage("solve_linkage_dimensions")
     def solve_linkage_dimensions(self) -> None:
-        r1 = 1                          
-        r4 = r1 / self.fsn_results[0]
-        r2 = r1 / self.fsn_results[1]
-        
-        k = sym.symbols("k")
-        r3_list = sym.solve((k**2 - r1**2 -r2**2 - r4**2) / (2*r2*r4) - self.fsn_results[2], k, real=True, rational=False)  # Returns a list with positive and negative result
-        r3 = max(r3_list)
-        
-        self.lengths = [r1, r2, r3, r4]
+        if self.engine == "numeric":
+            self.lengths = engine.solve_linkage_dimensions(self.fsn_results).tolist()
+        else:
+            r1 = 1                          
+            r4 = r1 / self.fsn_results[0]
+            r2 = r1 / self.fsn_results[1]
+            
+            import sympy as sym
+            k = sym.symbols("k")
+            r3_list = sym.solve((k**2 - r1**2 -r2**2 - r4**2) / (2*r2*r4) - self.fsn_results[2], k, real=True, rational=False)  # Returns a list with positive and negative result
+            r3 = max(r3_list)
+            
+            self.lengths = [r1, r2, r3, r4]
         
         if self.silent_flag is False:
             print("Linkage dimensions calculated as follows:")
@@ -357,8 +910,11 @@ class Solver:
         pass
     
     # Prints out the results of the calculations and performs graphical representation
+    # matplotlib is only imported here, so solving without plotting never loads it
+    @profiling.timed_stage("print_results")
     def print_results(self):
-        
+        import plotter
+
         print("starting angles are:")
         print("%.2f" % (math.degrees(self.theta2_start) % 360))
         print("%.2f" % (math.degrees(self.theta4_start) % 360))
@@ -396,7 +952,7 @@ if __name__ == "__main__":
                         x_min=math.pi/4, x_max=3*math.pi/4,
                         theta2_start=7*math.pi/12, theta2_max_rot=2*math.pi/3,
                         theta4_start=4*math.pi/3, theta4_max_rot=math.pi/3, 
-                        do_optimise=True)
+                        do_optimise=True, sweep="grid")
 
 
     # testSolver = Solver(func="ln(x)/ln(10)", 
@@ -1,7 +1,14 @@
 import math
 
-from matplotlib import pyplot as plt
-from matplotlib.animation import FuncAnimation
+import numpy as np
+
+import kinematics
+
+# Palette shared by every frame the numpy renderer draws, as (red, green, blue) for each index
+PALETTE = [(255, 255, 255),     # 0: background
+           (200, 200, 200),     # 1: grid
+           (31, 119, 180),      # 2: links
+           (20, 60, 110)]       # 3: joints
 
 #####################################################
 ##           Plotter and Animation Class           ##
@@ -14,6 +21,7 @@ class Plotter:
                  start_x, start_y,
                  theta2_angular_speed=1,
                  time_increment=0.05,
+                 resolution=None,
                  ) -> None:
         self.r1 = r1
         self.r2 = r2
@@ -26,44 +34,42 @@ class Plotter:
         self.t4_f = theta4_start + theta4_max_rot
         self.w2   = theta2_angular_speed
         self.time_inc = time_increment
-        self.points = []
+        self.resolution = resolution    # Number of input angles to analyse, overrides the time increment if given
+        self.points = np.zeros((0, 8))  # Joint positions Ax, Ay, Bx, By, Cx, Cy, Dx, Dy for each input angle
+        self.unassembled = np.zeros(0, dtype=bool)  # True where the linkage cannot be assembled
         
         self.start_x = start_x
         self.start_y = start_y
         
         pass
     
+    # Computes the joint positions for every input angle at once
+    # Angles where the linkage cannot be assembled are marked in self.unassembled and hold nan
     def generate_points(self) -> None:
-        r1, r2, r3, r4 = self.r1, self.r2, self.r3, self.r4
-        
-        t2_current = self.t2_i
-        t4_current = None
-        
-        while t2_current <= self.t2_f:
-            Ax = 0
-            Ay = 0
-            Dx = r1
-            Dy = 0
-            Bx = r2 * math.cos(t2_current)
-            By = r2 * math.sin(t2_current)
-            
-            AD = math.sqrt(r1**2 + r2**2 - 2*r1*r2*math.cos(t2_current))        # using cosine rule
-            angle1 = math.acos((r1**2 + AD**2 - r2**2) / (2*r1*AD))             # using cosine rule
-            if (By < 0):
-                angle1 = -angle1
-            angle2 = math.acos((r4**2 + AD**2 - r3**2) / (2*r4*AD))             # using cosine rule
-            t4_current = 2*math.pi - (angle1 + angle2)
-
-            Cx = Dx - r4 * math.cos(t4_current)
-            Cy = -r4 * math.sin(t4_current)
-
-            result = [Ax, Ay, Bx, By, Cx, Cy, Dx, Dy]
-            self.points.append(result)
-            
-            t2_current += self.w2 * self.time_inc
+        if self.resolution is None:
+            step = self.w2 * self.time_inc
+            count = math.floor((self.t2_f - self.t2_i) / step + 1e-9) + 1
+            theta2 = self.t2_i + step * np.arange(count)
+        else:
+            theta2 = np.linspace(self.t2_i, self.t2_f, self.resolution)
+
+        self.points, self.unassembled = kinematics.linkage_positions(self.r1, self.r2, self.r3, self.r4, theta2)
         pass
     
-    def animate_linkage(self):
+    # Streams the velocity and acceleration analysis of the linkage, driven at the plotter's angular speed
+    # from its start angle, as kinematics.stream_motion chunks sampled every time increment
+    # duration defaults to the time taken to sweep the input range once, longer studies run on past it
+    def stream_motion(self, duration=None, chunk_size=65536):
+        if duration is None:
+            duration = (self.t2_f - self.t2_i) / self.w2
+        return kinematics.stream_motion(self.r1, self.r2, self.r3, self.r4, self.t2_i, self.w2,
+                                        duration, self.time_inc, chunk_size=chunk_size)
+
+    # Animates the linkage with matplotlib and saves it as a gif
+    def animate_linkage(self, path="plot.gif"):
+        from matplotlib import pyplot as plt
+        from matplotlib.animation import FuncAnimation
+
         fig = plt.figure()
         ax = plt.axes(xlim=(-3, 3), ylim=(-3, 3))
         ax.set_aspect('equal')
@@ -81,4 +87,129 @@ class Plotter:
             return line, 
         
         anim = FuncAnimation(fig, animate, frames=len(self.points), init_func=init, interval=1, blit=True)
-        anim.save("plot.gif", writer='Pillow')
\ No newline at end of file
+        anim.save(path, writer='pillow')
+        plt.close(fig)
+
+    # Saves the motion of the linkage without matplotlib, drawing frames with numpy and writing them with Pillow
+    # mode "gif" writes an animation, "strip" a png of the frames side by side and "overlay" a png of them on top of each other
+    # The frames can be cut down to a number of frames, or to a frame rate given the input turns at theta2_angular_speed
+    # Only uses numpy and Pillow, so it is safe to call from worker processes
+    def export_animation(self, path="plot.gif", frames=None, fps=None, size=400, mode="gif"):
+        from PIL import Image
+
+        if mode not in ("gif", "strip", "overlay"):
+            raise ValueError("mode must be one of 'gif', 'strip' or 'overlay', not %r" % (mode,))
+        if len(self.points) == 0:
+            self.generate_points()
+
+        indices = self.frame_indices(frames, fps)
+        points = self.points[indices]
+        to_pixels = self.pixel_mapping(size)
+
+        if mode == "overlay":
+            canvas = self.blank_frame(size, to_pixels)
+            draw_linkage(canvas, to_pixels(points))
+            frames = [canvas]
+        else:
+            background = self.blank_frame(size, to_pixels)
+            frames = []
+            for frame_points in to_pixels(points):
+                canvas = background.copy()
+                draw_linkage(canvas, frame_points[None, :])
+                frames.append(canvas)
+
+        palette = [value for colour in PALETTE for value in colour]
+        if mode == "strip":
+            frames = [np.concatenate(frames, axis=1)]
+        images = []
+        for frame in frames:
+            image = Image.fromarray(frame, mode="P")
+            image.putpalette(palette)
+            images.append(image)
+
+        if mode == "gif":
+            duration = self.frame_duration(len(indices), fps)
+            images[0].save(path, format="GIF", save_all=True, append_images=images[1:], duration=duration, loop=0, optimize=False)
+        else:
+            images[0].save(path, format="PNG")
+        return path
+
+    # Indices of the points to draw, spread evenly over the motion
+    def frame_indices(self, frames=None, fps=None):
+        count = len(self.points)
+        if fps is not None:
+            duration = (self.t2_f - self.t2_i) / self.w2
+            frames = max(1, round(duration * fps)) + 1
+        if frames is None or frames >= count:
+            return np.arange(count)
+        return np.unique(np.linspace(0, count - 1, frames).round().astype(int))
+
+    # Time each gif frame is shown for in milliseconds, in real time unless a frame rate is given
+    def frame_duration(self, frames, fps=None):
+        if fps is not None:
+            return max(1, round(1000 / fps))
+        duration = (self.t2_f - self.t2_i) / self.w2
+        return max(1, round(1000 * duration / max(1, frames - 1)))
+
+    # Returns a function converting (n, 8) arrays of joint positions into pixel coordinates of a square image
+    # fitted around every position the linkage reaches
+    def pixel_mapping(self, size, margin=0.08):
+        xs = self.points[:, 0::2]
+        ys = self.points[:, 1::2]
+        x_min, x_max = np.nanmin(xs), np.nanmax(xs)
+        y_min, y_max = np.nanmin(ys), np.nanmax(ys)
+        extent = max(x_max - x_min, y_max - y_min, 1e-9)
+        scale = size * (1 - 2*margin) / extent
+        x_offset = size/2 - scale * (x_min + x_max)/2
+        y_offset = size/2 + scale * (y_min + y_max)/2
+
+        def to_pixels(points):
+            pixels = np.array(points, dtype=float)
+            pixels[..., 0::2] = x_offset + scale * pixels[..., 0::2]
+            pixels[..., 1::2] = y_offset - scale * pixels[..., 1::2]       # image rows count downwards
+            return pixels
+
+        to_pixels.scale = scale
+        to_pixels.origin = (x_offset, y_offset)
+        return to_pixels
+
+    # Background frame holding a grid with a line every unit, like the matplotlib plot
+    def blank_frame(self, size, to_pixels):
+        canvas = np.zeros((size, size), dtype=np.uint8)
+        x_offset, y_offset = to_pixels.origin
+        first = math.floor(-x_offset / to_pixels.scale)
+        columns = np.round(x_offset + to_pixels.scale * np.arange(first, first + size / to_pixels.scale + 2)).astype(int)
+        first = math.floor((y_offset - size) / to_pixels.scale)
+        rows = np.round(y_offset - to_pixels.scale * np.arange(first, first + size / to_pixels.scale + 2)).astype(int)
+        canvas[:, columns[(columns >= 0) & (columns < size)]] = 1
+        canvas[rows[(rows >= 0) & (rows < size)], :] = 1
+        return canvas
+
+
+# Draws the four links and joints of every row of (n, 8) pixel coordinates onto a canvas of palette indices
+def draw_linkage(canvas, pixels):
+    joints = pixels.reshape(-1, 4, 2)
+    starts = joints.reshape(-1, 2)
+    ends = np.roll(joints, -1, axis=1).reshape(-1, 2)
+    draw_segments(canvas, starts, ends, 2, width=2)
+    draw_segments(canvas, starts, starts, 3, width=4)
+    pass
+
+
+# Draws straight segments between (m, 2) arrays of pixel coordinates, skipping any with a nan end
+def draw_segments(canvas, starts, ends, colour, width=1):
+    finite = np.all(np.isfinite(starts), axis=1) & np.all(np.isfinite(ends), axis=1)
+    starts, ends = starts[finite], ends[finite]
+    if len(starts) == 0:
+        return
+
+    samples = int(np.max(np.abs(ends - starts))) + 2
+    steps = np.linspace(0, 1, samples)[None, :, None]
+    line = (starts[:, None, :] + (ends - starts)[:, None, :] * steps).reshape(-1, 2)
+
+    offsets = np.arange(width) - (width - 1) // 2
+    columns = (np.round(line[:, 0])[:, None, None] + offsets[None, :, None]).astype(int).ravel()
+    rows = (np.round(line[:, 1])[:, None, None] + offsets[None, None, :]).astype(int).ravel()
+    inside = (columns >= 0) & (columns < canvas.shape[1]) & (rows >= 0) & (rows < canvas.shape[0])
+    canvas[rows[inside], columns[inside]] = colour
+    pass
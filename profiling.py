@@ -0,0 +1,62 @@
+import functools
+import json
+import time
+
+#####################################################
+##              Solver Instrumentation             ##
+#####################################################
+
+
+# Cumulative wall time and call count of each stage of a synthesis, and counters of candidates
+# Stage times are inclusive, so a sweep's time also contains the stages it calls
+class SolverStats:
+    def __init__(self) -> None:
+        self.stages = {}        # Stage name -> {"seconds": total wall time, "calls": number of calls}
+        self.counters = {}      # Counter name -> total
+        self.hooks = []         # Functions called as hook(stage, seconds) each time a stage finishes
+        pass
+
+    # Adds the time of one call to a stage, then passes it on to the hooks
+    def record(self, stage, seconds) -> None:
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        for hook in self.hooks:
+            hook(stage, seconds)
+        pass
+
+    def count(self, counter, amount=1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + int(amount)
+        pass
+
+    def add_hook(self, hook) -> None:
+        self.hooks.append(hook)
+        pass
+
+    def reset(self) -> None:
+        self.stages.clear()
+        self.counters.clear()
+        pass
+
+    def as_dict(self) -> dict:
+        return {"stages": {stage: dict(entry) for stage, entry in self.stages.items()},
+                "counters": dict(self.counters)}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.as_dict(), **kwargs)
+
+
+# Decorator timing a method as a stage in self.stats, which does nothing more than a check when stats is None
+def timed_stage(stage):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.stats is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.stats.record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
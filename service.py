@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import sys
+import time
+
+import batch
+import cache
+import expressions
+
+#####################################################
+##             Local Synthesis Service             ##
+#####################################################
+# Serves the synthesis over HTTP on localhost (or a Unix socket), so tools can share one warm pool of
+# solver processes instead of each embedding their own:
+#   python service.py --port 8080 --workers 4 --cache results.sqlite
+#   POST /solve    a job as in batch.py, optionally with "deadline" in seconds, returns its result
+#   GET  /metrics  queue depth, requests served and latency
+#   GET  /health
+# Identical jobs in flight at the same time are solved once and every request gets the result
+# Jobs come from anything that can reach the port, so they are checked before anything is done with them:
+# bodies must be sent as application/json, func must be plain arithmetic of x (never parsed by sympy),
+# checkpoints are refused and tables are only read from the directory given by --tables
+
+LATENCY_WINDOW = 1000       # Number of recent request latencies the metrics are worked out from
+
+_worker_cache = None        # Result cache opened by each worker process the first time it solves a job
+
+
+# Solves a job in a worker process, sharing one result cache per process when cache_path is given
+def solve_in_worker(spec, cache_path=None, cache_size=10000) -> dict:
+    global _worker_cache
+    if cache_path is not None and _worker_cache is None:
+        _worker_cache = cache.ResultCache(cache_path, cache_size)
+    return batch.solve_job(spec, _worker_cache)
+
+
+# Key identifying a job, the same for every job that would find the same linkage
+# Anytime results depend on their budgets, so only anytime jobs with the same budgets and target share one
+# A table is keyed on its file's path, modification time and size rather than read, as reading and hashing
+# a large one here would hold up every other request while the worker reads it again anyway
+# Jobs that cannot be built into a solver are not coalesced, and fail when solved
+def job_key(spec):
+    table = spec.get("table")
+    try:
+        if table is not None:
+            info = os.stat(table)
+            if "func" in spec:
+                return None
+            spec = dict(spec, func="x")         # stands in for the table, which is keyed below
+            del spec["table"]
+        solver = batch.build_solver(spec)
+    except Exception:
+        return None
+
+    key = cache.ResultCache.key_for(solver)
+    if table is not None:
+        key = (key, os.path.abspath(table), info.st_mtime_ns, info.st_size)
+    if solver.sweep == "anytime":
+        key = (key, solver.time_budget, solver.evaluation_budget, solver.target_score)
+    return key
+
+
+class SynthesisService:
+    def __init__(self, workers=2, cache_path=None, cache_size=10000, table_dir=None) -> None:
+        self.workers = workers
+        self.cache_path = cache_path
+        self.cache_size = cache_size
+        self.table_dir = table_dir      # Directory jobs may read tables from, tables are refused if None
+        self.pool = None
+        self.slots = None               # Limits the jobs handed to the pool to one per worker
+        self.in_flight = {}             # Job key -> [task solving it, number of requests waiting on it]
+
+        self.queued = 0                 # Jobs waiting for a free worker
+        self.running = 0                # Jobs being solved by a worker
+        self.counters = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        pass
+
+    # Workers are spawned rather than forked, as forked ones would inherit the open client connections
+    # and hold them open after the service closes them
+    def start(self) -> None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.slots = asyncio.Semaphore(self.workers)
+        pass
+
+    def close(self) -> None:
+        for task, _ in self.in_flight.values():
+            task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        pass
+
+    # Solves a job, waiting at most deadline seconds, sharing the work with identical jobs in flight
+    # Raises asyncio.TimeoutError when the deadline passes. A job nobody is waiting for any more is
+    # cancelled if it has not reached a worker yet, a job already being solved finishes unused
+    async def solve(self, spec, deadline=None) -> dict:
+        job_id = spec.get("id")
+        spec = {key: value for key, value in spec.items() if key != "id"}
+        key = job_key(spec)
+
+        entry = self.in_flight.get(key)
+        if entry is not None and not entry[0].done():
+            self.counters["coalesced"] += 1
+        else:
+            entry = [asyncio.ensure_future(self.compute(spec)), 0]
+            if key is not None:
+                self.in_flight[key] = entry
+                entry[0].add_done_callback(lambda _: self.forget(key, entry))
+
+        entry[1] += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(entry[0]), deadline)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+        return dict(result, id=job_id)
+
+    # Returns the job to solve, with its table (if any) resolved inside table_dir
+    # Raises ValueError for anything a job sent to the service may not do
+    def check_job(self, spec) -> dict:
+        if "checkpoint" in spec:
+            raise ValueError("the service does not accept checkpoint")
+        func = spec.get("func", "x")
+        if not isinstance(func, str) or expressions.fast_compile(func) is None:
+            raise ValueError("func must be arithmetic of x using numbers, + - * / **, %s and %s"
+                             % (", ".join(sorted(expressions.FAST_FUNCTIONS)), ", ".join(expressions.FAST_CONSTANTS)))
+
+        if "table" in spec:
+            if self.table_dir is None:
+                raise ValueError("tables are not enabled, start the service with --tables")
+            if not isinstance(spec["table"], str):
+                raise ValueError("table must be a path inside the table directory")
+            root = os.path.realpath(self.table_dir)
+            path = os.path.realpath(os.path.join(root, spec["table"]))
+            if os.path.commonpath([root, path]) != root:
+                raise ValueError("table must be a path inside the table directory")
+            spec = dict(spec, table=path)
+        return spec
+
+    def forget(self, key, entry) -> None:
+        if self.in_flight.get(key) is entry:
+            del self.in_flight[key]
+        pass
+
+    # A job cancelled before it reaches a worker gives up its place in the queue. Once it has been handed to
+    # the pool it keeps its slot until the worker finishes it, even if nobody waits for the result any more,
+    # as the worker is busy until then
+    async def compute(self, spec) -> dict:
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, solve_in_worker, spec, self.cache_path, self.cache_size)
+        except BaseException:
+            self.finished(None)
+            raise
+        future.add_done_callback(self.finished)
+        return await asyncio.shield(future)
+
+    # Frees the worker slot of a job the pool has finished with
+    def finished(self, future) -> None:
+        self.running -= 1
+        self.slots.release()
+        if future is not None and not future.cancelled():
+            future.exception()          # retrieved, so an abandoned job that failed is not reported as unhandled
+        pass
+
+    def metrics(self) -> dict:
+        latencies = sorted(self.latencies)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+        return {"queue_depth": self.queued, "running": self.running, "in_flight": len(self.in_flight),
+                "workers": self.workers, "uptime": time.time() - self.started, "requests": dict(self.counters),
+                "latency": {"count": len(latencies), "mean": sum(latencies) / len(latencies) if latencies else None,
+                            "p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)}}
+
+    # Handles one HTTP request per connection
+    async def handle(self, reader, writer) -> None:
+        start = time.perf_counter()
+        try:
+            status, body = await self.respond(reader)
+        except Exception as error:
+            status, body = 500, {"error": "%s: %s" % (type(error).__name__, error)}
+        self.counters[str(status)] += 1
+        self.latencies.append(time.perf_counter() - start)
+
+        text = json.dumps(body).encode()
+        try:
+            writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                         b"Connection: close\r\n\r\n" % (status, REASONS[status].encode(), len(text)) + text)
+            await writer.drain()
+            writer.close()
+        except ConnectionError:
+            pass
+
+    async def respond(self, reader) -> tuple:
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+        except ValueError:
+            return 400, {"error": "malformed request line"}
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics()
+        if path != "/solve":
+            return 404, {"error": "no such endpoint %s" % path}
+        if method != "POST":
+            return 405, {"error": "use POST to solve a job"}
+        # a web page can only send other content types without asking first, so this keeps browsers out
+        if headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+            return 415, {"error": "send the job as application/json"}
+
+        try:
+            spec = json.loads(body)
+        except ValueError as error:
+            return 400, {"error": "body is not valid JSON (%s)" % error}
+        if not isinstance(spec, dict):
+            return 400, {"error": "body is not a JSON object"}
+        deadline = spec.pop("deadline", None)
+        try:
+            spec = self.check_job(spec)
+        except ValueError as error:
+            return 400, {"id": spec.get("id"), "error": str(error)}
+
+        # the client closing its side of the connection cancels the request
+        solving = asyncio.ensure_future(self.solve(spec, deadline))
+        closed = asyncio.ensure_future(reader.read())
+        done, _ = await asyncio.wait((solving, closed), return_when=asyncio.FIRST_COMPLETED)
+        if solving not in done:
+            solving.cancel()
+            self.counters["cancelled"] += 1
+            return 499, {"id": spec.get("id"), "error": "cancelled by the client"}
+        closed.cancel()
+
+        try:
+            result = solving.result()
+        except asyncio.TimeoutError:
+            return 504, {"id": spec.get("id"), "error": "deadline of %gs passed" % deadline}
+        return (200 if "error" not in result else 422), result
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           415: "Unsupported Media Type", 422: "Unprocessable Entity", 499: "Client Closed Request", 500: "Internal Server Error",
+           504: "Gateway Timeout"}
+
+
+async def serve(service, host="127.0.0.1", port=8080, unix=None) -> None:
+    service.start()
+    if unix is not None:
+        server = await asyncio.start_unix_server(service.handle, unix)
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def run(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve four bar linkage synthesis over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on, localhost by default")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of a port")
+    parser.add_argument("--workers", type=int, default=2, help="number of solver processes")
+    parser.add_argument("--cache", help="SQLite file caching results between requests and runs")
+    parser.add_argument("--cache-size", type=int, default=10000, help="most results kept in the cache")
+    parser.add_argument("--tables", help="directory jobs may read tables of measured values from")
+    args = parser.parse_args(argv)
+
+    service = SynthesisService(args.workers, args.cache, args.cache_size, args.tables)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,62 @@
+import math
+
+import main
+
+LOG10 = dict(func="log(x)/log(10)", x_min=1, x_max=2,
+             theta2_start=math.radians(100), theta2_max_rot=math.radians(120),
+             theta4_start=math.radians(240), theta4_max_rot=math.radians(60))
+
+
+def anytime_solver(**options):
+    solver = main.Solver(**LOG10, do_optimise=True, sweep="anytime", sweep_step=1)
+    for name, value in options.items():
+        setattr(solver, name, value)
+    return solver
+
+
+def test_unlimited_search_finds_the_grid_optimum():
+    grid = main.Solver(**LOG10, do_optimise=True, sweep="grid", sweep_step=1)
+    grid.minimum_range = 0
+    lengths = grid.find_optimal_linkage()
+
+    solver = anytime_solver()
+    assert solver.find_optimal_linkage() == lengths
+    assert (solver.theta2_start, solver.theta4_start) == (grid.theta2_start, grid.theta4_start)
+    assert solver.search_report["stopped"] == "complete"
+    assert solver.search_report["coverage"] == 1.0
+
+
+def test_default_minimum_range_does_not_cut_the_budget_short():
+    solver = anytime_solver(time_budget=60)
+    assert solver.minimum_range == 3
+    solver.find_optimal_linkage()
+    assert solver.search_report["stopped"] == "complete"
+
+
+def test_evaluation_budget_is_respected_and_progress_only_improves():
+    designs = []
+    solver = anytime_solver(evaluation_budget=5000, progress=designs.append)
+    lengths = solver.find_optimal_linkage()
+
+    report = solver.search_report
+    assert report["stopped"] == "evaluation_budget"
+    assert report["evaluations"] == 5000
+    assert 0 < report["coverage"] < 1
+    scores = [design["score"] for design in designs]
+    assert scores == sorted(scores, reverse=True) and len(set(scores)) == len(scores)
+    assert designs[-1]["lengths"] == lengths
+    assert report["score"] == scores[-1]
+
+
+def test_target_score_stops_the_search():
+    solver = anytime_solver(target_score=3)
+    solver.find_optimal_linkage()
+    assert solver.search_report["stopped"] == "target_score"
+    assert solver.search_report["score"] < 3
+
+
+def test_time_budget_of_zero_finds_nothing():
+    solver = anytime_solver(time_budget=0)
+    assert solver.find_optimal_linkage() == [0, 0, 0, 0]
+    assert solver.search_report["stopped"] == "time_budget"
+    assert solver.search_report["evaluations"] == 0
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import cache
+import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def solve(result_cache, func="log(x)/log(10)", **options):
+    solver = main.Solver(func=func, x_min=1, x_max=2, do_optimise=True, sweep="grid", cache=result_cache)
+    for name, value in options.items():
+        setattr(solver, name, value)
+    lengths = solver.find_optimal_linkage()
+    return lengths, solver.from_cache
+
+
+def test_equivalent_expressions_share_an_entry(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path / "results.sqlite"))
+    lengths, cached = solve(result_cache)
+    assert not cached
+    assert solve(result_cache, "(log(x)) / log(10.0)") == (lengths, True)
+    assert not solve(result_cache, "log(x)/log(10)", minimum_range=0)[1]
+
+
+def test_adaptive_settings_are_part_of_the_key(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path / "results.sqlite"))
+    solve(result_cache, sweep="adaptive")
+    assert not solve(result_cache, sweep="adaptive", adaptive_polish=False, adaptive_coarse_step=30)[1]
+    assert solve(result_cache, sweep="adaptive", adaptive_polish=False, adaptive_coarse_step=30)[1]
+
+
+def test_cached_solve_of_simple_expression_does_not_load_sympy(tmp_path):
+    script = ("import sys, cache, main\n"
+              "solver = main.Solver(func='x**2', x_min=0.5, x_max=2, sweep='grid', cache=cache.ResultCache(%r))\n"
+              "solver.find_optimal_linkage()\n"
+              "print('sympy' in sys.modules)\n" % str(tmp_path / "results.sqlite"))
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "False"
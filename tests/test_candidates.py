@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+
+import candidates
+import main
+
+LOG10 = dict(func="log(x)/log(10)", x_min=1, x_max=2,
+             theta2_start=math.radians(100), theta2_max_rot=math.radians(120),
+             theta4_start=math.radians(240), theta4_max_rot=math.radians(60))
+
+
+def same_candidates(first, second):
+    return all(np.array_equal(first[field], second[field], equal_nan=first.dtype[field].kind == "f")
+               for field in candidates.CANDIDATE_DTYPE.names)
+
+
+def solve(keep_candidates=True, sweep="grid"):
+    solver = main.Solver(**LOG10, do_optimise=True, sweep=sweep, sweep_step=5, keep_candidates=keep_candidates)
+    solver.minimum_range = 0
+    solver.find_optimal_linkage()
+    return solver
+
+
+def test_store_holds_every_candidate_and_its_best_is_the_chosen_linkage():
+    solver = solve()
+    store = solver.candidates
+    assert len(store) == 72 * 72
+
+    best = store.feasible().top(1)[0]
+    assert (best["theta2_start"], best["theta4_start"]) == (solver.theta2_start, solver.theta4_start)
+    assert [best["r1"], best["r2"], best["r3"], best["r4"]] == pytest.approx(solver.lengths)
+
+
+def test_queries():
+    store = solve().candidates
+    feasible = store.feasible()
+    assert len(feasible) == np.count_nonzero(store["non_negative"] & store["assembles"] & store["within_limits"])
+
+    short = feasible.filter(lambda data: data["r2"] < 0.5)
+    assert len(short) and np.all(short["r2"] < 0.5)
+    assert len(feasible.filter(feasible["r2"] < 0.5)) == len(short)
+
+    ordered = feasible.sort("range")
+    assert np.all(np.diff(ordered["range"]) >= 0)
+    assert np.all(np.diff(feasible.sort("range", descending=True)["range"]) <= 0)
+
+    top = feasible.top(5, "range")
+    assert np.array_equal(top["range"], ordered["range"][:5])
+    assert len(feasible.top(10**6)) == len(feasible)
+
+
+@pytest.mark.parametrize("name", ["candidates.npz", "candidates.npy"])
+def test_save_and_load(tmp_path, name):
+    store = solve().candidates
+    path = str(tmp_path / name)
+    store.save(path)
+    loaded = candidates.CandidateStore.load(path)
+    assert same_candidates(loaded[:], store[:])
+    if name.endswith(".npy"):
+        assert isinstance(loaded.data, np.memmap)
+
+
+def test_sweep_writes_straight_to_a_memory_map(tmp_path):
+    path = str(tmp_path / "candidates.npy")
+    in_memory = solve().candidates
+    mapped = solve(keep_candidates=path).candidates
+    assert isinstance(mapped.data, np.memmap)
+    assert same_candidates(candidates.CandidateStore.load(path)[:], in_memory[:])
+
+
+def test_adaptive_sweep_keeps_what_it_evaluated():
+    solver = solve(sweep="adaptive")
+    assert len(solver.candidates) == solver.search_report["evaluations"]
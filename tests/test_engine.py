@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+import pytest
+
+import engine
+import expressions
+import main
+
+LOG10 = dict(func="log(x)/log(10)", x_min=1, x_max=2,
+             theta2_start=math.radians(100), theta2_max_rot=math.radians(120),
+             theta4_start=math.radians(240), theta4_max_rot=math.radians(60))
+
+
+def solve_at(engine_name, theta2_start, theta4_start):
+    solver = main.Solver(**dict(LOG10, theta2_start=theta2_start, theta4_start=theta4_start), engine=engine_name)
+    solver.find_chebyshev_spacing()
+    solver.find_corresponding_y_points()
+    solver.linear_mapping_x_to_theta2()
+    solver.linear_mapping_y_to_theta4()
+    solver.determine_corresponding_angles()
+    solver.solve_freudenstein()
+    solver.solve_linkage_dimensions()
+    return [float(k) for k in solver.fsn_results], [float(length) for length in solver.lengths]
+
+
+@pytest.mark.parametrize("theta2_start, theta4_start", [(1.0, 4.0), (1.745, 4.189), (0.3, 2.0), (2.5, 5.5)])
+def test_numeric_engine_matches_sympy(theta2_start, theta4_start):
+    k_numeric, lengths_numeric = solve_at("numeric", theta2_start, theta4_start)
+    k_sympy, lengths_sympy = solve_at("sympy", theta2_start, theta4_start)
+    assert np.allclose(k_numeric, k_sympy, rtol=engine.ENGINE_TOLERANCE, atol=engine.ENGINE_TOLERANCE)
+    assert np.allclose(lengths_numeric, lengths_sympy, rtol=engine.ENGINE_TOLERANCE, atol=engine.ENGINE_TOLERANCE)
+
+
+def sweep(sweep, optimise, minimum_range, workers=1, **options):
+    solver = main.Solver(**LOG10, do_optimise=optimise, sweep=sweep, sweep_step=5, workers=workers)
+    solver.minimum_range = minimum_range
+    for name, value in options.items():
+        setattr(solver, name, value)
+    lengths = solver.find_optimal_linkage()
+    return lengths, solver.theta2_start, solver.theta4_start
+
+
+@pytest.mark.parametrize("optimise, minimum_range", [(True, 0), (True, 0.3), (False, 3)])
+def test_grid_and_parallel_sweeps_pick_the_loop_sweeps_linkage(optimise, minimum_range):
+    lengths, theta2_start, theta4_start = sweep("loop", optimise, minimum_range)
+    assert any(lengths)
+    for workers in (1, 3):
+        grid_lengths, grid_theta2, grid_theta4 = sweep("grid", optimise, minimum_range, workers)
+        assert (grid_theta2, grid_theta4) == (theta2_start, theta4_start)
+        assert np.allclose(grid_lengths, lengths, rtol=engine.ENGINE_TOLERANCE, atol=engine.ENGINE_TOLERANCE)
+
+
+@pytest.mark.parametrize("optimise, minimum_range", [(True, 0), (True, 0.3), (False, 3)])
+def test_resumed_checkpointed_sweep_matches_an_uninterrupted_one(tmp_path, monkeypatch, optimise, minimum_range):
+    expected = sweep("grid", optimise, minimum_range)
+    path = str(tmp_path / "sweep.checkpoint")
+
+    sweep_rows = engine.sweep_rows
+    calls = []
+
+    def interrupted(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return sweep_rows(*args, **kwargs)
+
+    monkeypatch.setattr(engine, "sweep_rows", interrupted)
+    try:
+        sweep("grid", optimise, minimum_range, checkpoint=path, tile_rows=8)
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.setattr(engine, "sweep_rows", sweep_rows)
+
+    resumed = main.Solver(**LOG10, do_optimise=optimise, sweep="grid", sweep_step=5)
+    resumed.minimum_range, resumed.checkpoint, resumed.tile_rows = minimum_range, path, 8
+    lengths = resumed.find_optimal_linkage()
+    assert (lengths, resumed.theta2_start, resumed.theta4_start) == expected
+    if len(calls) == 3:
+        assert resumed.search_report["resumed"] == 2
+
+
+def test_checkpoint_of_another_sweep_is_refused(tmp_path):
+    path = str(tmp_path / "sweep.checkpoint")
+    sweep("grid", True, 0, checkpoint=path)
+    with pytest.raises(ValueError):
+        sweep("grid", True, 0.3, checkpoint=path)
+
+
+def test_table_spanning_exactly_the_x_range_can_be_sampled():
+    x_vals = np.linspace(0.11608040201005027, 0.63, 500)
+    table = expressions.TabulatedFunction(x_vals, np.sqrt(x_vals))
+    solver = main.Solver(func=table, x_min=x_vals[0], x_max=x_vals[-1], theta2_start=1.0, theta2_max_rot=1.5,
+                         theta4_start=4.0, theta4_max_rot=1.0, do_optimise=True, sweep="grid")
+    solver.objective = "error"
+    solver.minimum_range = 0
+    assert any(solver.find_optimal_linkage())
+    assert np.isfinite(solver.structural_error()["max"])
+    assert solver.tolerance_analysis(samples=1000)["samples"] == 1000
@@ -0,0 +1,50 @@
+import math
+
+import pytest
+
+import main
+
+LOG10 = dict(func="log(x)/log(10)", x_min=1, x_max=2,
+             theta2_start=math.radians(100), theta2_max_rot=math.radians(120),
+             theta4_start=math.radians(240), theta4_max_rot=math.radians(60))
+
+# Changes applied one after another to the same incremental solver
+CHANGES = [dict(minimum_range=0), dict(minimum_range=0.5), dict(optimise_results=False),
+           dict(optimise_results=True, objective="error"), dict(objective="combined", error_weight=2.0),
+           dict(theta2_max_rot=math.radians(100)), dict(func="x**2"), dict(x_min=1.2),
+           dict(mechanism_types=["crank-rocker"]), dict(sweep_step=6)]
+
+
+def apply(solver, changes):
+    for name, value in changes.items():
+        if name == "func":
+            value = main.expressions.compile_expression(value)
+        setattr(solver, name, value)
+
+
+def test_every_re_solve_matches_a_fresh_solve():
+    solver = main.Solver(**LOG10, do_optimise=True, sweep="grid", sweep_step=5, incremental=True)
+    settings = {}
+    for changes in CHANGES:
+        apply(solver, changes)
+        settings.update(changes)
+        lengths = solver.find_optimal_linkage()
+
+        fresh = main.Solver(**LOG10, do_optimise=True, sweep="grid", sweep_step=5)
+        apply(fresh, settings)
+        assert lengths == pytest.approx(fresh.find_optimal_linkage(), abs=1e-12)
+        assert (solver.theta2_start, solver.theta4_start) == pytest.approx((fresh.theta2_start, fresh.theta4_start))
+
+
+def test_changing_only_the_selection_keeps_the_evaluated_grid():
+    solver = main.Solver(**LOG10, do_optimise=True, sweep="grid", sweep_step=5, incremental=True)
+    solver.find_optimal_linkage()
+    grid = solver.sweep_results
+
+    solver.minimum_range = 0
+    solver.find_optimal_linkage()
+    assert solver.sweep_results is grid
+
+    solver.theta4_max_rot = math.radians(70)
+    solver.find_optimal_linkage()
+    assert solver.sweep_results is not grid
@@ -0,0 +1,52 @@
+import io
+
+import numpy as np
+
+import kinematics
+
+# A crank-rocker that assembles at every input angle
+LENGTHS = (1.0, 0.4, 1.1, 0.9)
+
+
+def test_velocities_and_accelerations_match_finite_differences():
+    omega2, alpha2, step = 2.0, 0.7, 1e-5
+    t = np.linspace(0, 3, 40)
+    angle = lambda t: 0.3 + omega2*t + 0.5*alpha2*t**2
+    speed = lambda t: omega2 + alpha2*t
+
+    states = kinematics.motion_states(*LENGTHS, angle(t), speed(t), alpha2)
+    before = kinematics.motion_states(*LENGTHS, angle(t - step), speed(t - step), alpha2)
+    after = kinematics.motion_states(*LENGTHS, angle(t + step), speed(t + step), alpha2)
+    assert states["assembled"].all()
+
+    for link in ("3", "4"):
+        turned = np.angle(np.exp(1j*(after["theta" + link] - before["theta" + link])))
+        assert np.allclose(turned / (2*step), states["omega" + link], rtol=1e-6, atol=1e-6)
+        assert np.allclose((after["omega" + link] - before["omega" + link]) / (2*step), states["alpha" + link],
+                           rtol=1e-5, atol=1e-5)
+
+
+def test_loop_closes_at_every_sample():
+    r1, r2, r3, r4 = LENGTHS
+    states = kinematics.motion_states(*LENGTHS, np.linspace(0, 2*np.pi, 50), 1.0)
+    closure = (r2*np.exp(1j*states["theta2"]) + r3*np.exp(1j*states["theta3"])
+               + r4*np.exp(1j*states["theta4"]))
+    assert np.allclose(closure, r1)
+
+
+def test_stream_is_chunked_and_written_in_both_formats(tmp_path):
+    chunks = list(kinematics.stream_motion(*LENGTHS, 0.0, 1.0, duration=1.0, time_step=1e-3, chunk_size=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 101]
+    whole = np.concatenate(chunks)
+    assert np.allclose(whole["t"], np.arange(1001) * 1e-3)
+
+    path = str(tmp_path / "motion.bin")
+    with open(path, "wb") as file:
+        assert kinematics.write_motion_binary(chunks, file) == 1001
+    assert np.array_equal(np.fromfile(path, dtype=kinematics.MOTION_DTYPE), whole)
+
+    text = io.StringIO()
+    assert kinematics.write_motion_csv(chunks, text) == 1001
+    rows = np.loadtxt(io.StringIO(text.getvalue()), delimiter=",", skiprows=1)
+    assert rows.shape == (1001, len(kinematics.MOTION_DTYPE.names))
+    assert np.allclose(rows[:, kinematics.MOTION_DTYPE.names.index("theta3")], whole["theta3"], rtol=1e-9)
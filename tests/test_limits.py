@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+import pytest
+
+import engine
+import kinematics
+import main
+
+LOG10 = dict(func="log(x)/log(10)", x_min=1, x_max=2,
+             theta2_start=math.radians(100), theta2_max_rot=math.radians(120),
+             theta4_start=math.radians(240), theta4_max_rot=math.radians(60))
+
+
+def random_linkages(count, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = np.column_stack([np.ones(count), rng.uniform(0.1, 2.5, (count, 3))])
+    return lengths, rng.uniform(-2*np.pi, 2*np.pi, count), rng.uniform(-7, 7, count)
+
+
+# Smallest and largest diagonal, and whether the linkage assembles, sampled densely over each turn
+def sampled(lengths, theta2_starts, theta2_rots, samples=4001):
+    r1, r2, r3, r4 = lengths.T[..., None]
+    theta2 = theta2_starts[:, None] + theta2_rots[:, None] * np.linspace(0, 1, samples)
+    diagonal = np.sqrt(r1**2 + r2**2 - 2*r1*r2*np.cos(theta2))
+    _, assembled = kinematics.output_angles(r1, r2, r3, r4, theta2)
+    return diagonal.min(axis=1), diagonal.max(axis=1), assembled.all(axis=1)
+
+
+def test_diagonal_extremes_match_sampling():
+    lengths, theta2_starts, theta2_rots = random_linkages(2000)
+    least, most = kinematics.diagonal_extremes(lengths[:, 0], lengths[:, 1], theta2_starts, theta2_rots)
+    sampled_least, sampled_most, _ = sampled(lengths, theta2_starts, theta2_rots)
+    assert np.all(least <= sampled_least + 1e-12) and np.all(least >= sampled_least - 1e-3)
+    assert np.all(most >= sampled_most - 1e-12) and np.all(most <= sampled_most + 1e-3)
+
+
+def test_full_range_assembly_matches_sampling():
+    lengths, theta2_starts, theta2_rots = random_linkages(2000, seed=1)
+    checks = engine.limit_checks(lengths, theta2_starts, theta2_rots, {"full_range": True})
+    least, most, assembled = sampled(lengths, theta2_starts, theta2_rots)
+    r3, r4 = lengths[:, 2], lengths[:, 3]
+    # leave out linkages that only just reach a toggle position, where sampling cannot decide
+    clear = (np.minimum(np.abs(least - np.abs(r3 - r4)), np.abs(r3 + r4 - most)) > 1e-3)
+    assert np.array_equal(checks["full_range_assembly"][clear], assembled[clear])
+    assert 0 < np.count_nonzero(assembled[clear]) < np.count_nonzero(clear)
+
+
+def test_transmission_angle_limit_matches_sampling():
+    lengths, theta2_starts, theta2_rots = random_linkages(1000, seed=2)
+    smallest = math.radians(35)
+    limits = {"full_range": True, "min_transmission_angle": smallest}
+    checks = engine.limit_checks(lengths, theta2_starts, theta2_rots, limits)
+    passes = checks["full_range_assembly"] & checks["transmission_angle"]
+
+    least, most, assembled = sampled(lengths, theta2_starts, theta2_rots)
+    r3, r4 = lengths[:, 2], lengths[:, 3]
+    # the transmission angle falls as the diagonal shrinks, so its extremes are at the diagonal's
+    lowest, highest = kinematics.transmission_angle(r3, r4, least), kinematics.transmission_angle(r3, r4, most)
+    within = assembled & (lowest >= smallest) & (highest <= np.pi - smallest)
+    clear = (np.abs(lowest - smallest) > 1e-3) & (np.abs(highest - (np.pi - smallest)) > 1e-3)
+    assert np.array_equal(passes[clear], within[clear])
+    assert 0 < np.count_nonzero(within[clear])
+
+
+def test_grashof_cranks_turn_fully_and_others_do_not():
+    lengths, _, _ = random_linkages(2000, seed=3)
+    types = np.array(kinematics.MECHANISM_TYPES)[kinematics.mechanism_types(*lengths.T)]
+    _, _, turns = sampled(lengths, np.zeros(len(lengths)), np.full(len(lengths), 2*np.pi))
+    known = types != "change-point"
+    assert np.array_equal(turns[known], np.isin(types[known], ["crank-rocker", "double-crank"]))
+
+
+def test_rejections_are_counted_once_by_first_failed_check():
+    solver = main.Solver(**LOG10, do_optimise=True, sweep="grid", sweep_step=5, profile=True)
+    solver.minimum_range = 0
+    solver.mechanism_types = ["crank-rocker"]
+    solver.full_range_assembly = True
+    solver.min_transmission_angle = math.radians(40)
+    lengths = solver.find_optimal_linkage()
+
+    counts = solver.get_stats()["counters"]
+    rejected = sum(amount for name, amount in counts.items() if name.startswith("rejected_"))
+    assert counts["rejected_mechanism_type"] > 0 and counts["rejected_transmission_angle"] > 0
+    assert rejected < counts["candidates_evaluated"]
+
+    assert kinematics.MECHANISM_TYPES[kinematics.mechanism_types(*lengths)] == "crank-rocker"
+    theta2 = solver.theta2_start + solver.theta2_max_rot * np.linspace(0, 1, 2001)
+    states = kinematics.motion_states(*lengths, theta2, 1.0)
+    assert states["assembled"].all()
+    assert states["transmission"].min() >= math.radians(40) - 1e-9
+    assert states["transmission"].max() <= math.radians(140) + 1e-9
+
+
+def test_unknown_mechanism_type_is_refused():
+    solver = main.Solver(**LOG10, do_optimise=True, sweep="grid")
+    solver.mechanism_types = ["crank"]
+    with pytest.raises(ValueError):
+        solver.find_optimal_linkage()
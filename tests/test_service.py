@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import service
+
+SLOW_JOB = {"func": "x**2", "x_min": 0.5, "x_max": 2, "do_optimise": True, "minimum_range": 0, "sweep_step": 0.5}
+
+
+async def request(port, method, path, body=None, content_type="application/json"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else b""
+    head = "%s %s HTTP/1.1\r\nContent-Length: %d\r\n" % (method, path, len(data))
+    if content_type is not None:
+        head += "Content-Type: %s\r\n" % content_type
+    writer.write(head.encode() + b"\r\n" + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b" ", 2)[1])
+    return status, json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+# Runs scenario(port, service) against a service listening on a free localhost port
+def run_service(scenario, **options):
+    async def main():
+        synthesis = service.SynthesisService(workers=1, **options)
+        synthesis.start()
+        server = await asyncio.start_server(synthesis.handle, "127.0.0.1", 0)
+        try:
+            return await scenario(server.sockets[0].getsockname()[1], synthesis)
+        finally:
+            server.close()
+            synthesis.close()
+    return asyncio.run(main())
+
+
+def test_identical_jobs_in_flight_are_solved_once():
+    async def scenario(port, synthesis):
+        responses = await asyncio.gather(request(port, "POST", "/solve", dict(SLOW_JOB, id=1)),
+                                         request(port, "POST", "/solve", dict(SLOW_JOB, id=2)))
+        return responses, synthesis.counters["coalesced"]
+
+    ((status1, result1), (status2, result2)), coalesced = run_service(scenario)
+    assert coalesced == 1
+    assert status1 == status2 == 200
+    assert (result1["id"], result2["id"]) == (1, 2)
+    assert result1["lengths"] == result2["lengths"]
+
+
+def test_deadline_and_metrics_while_the_worker_is_still_busy():
+    async def scenario(port, synthesis):
+        status, _ = await request(port, "POST", "/solve", dict(SLOW_JOB, deadline=0.01))
+        metrics = synthesis.metrics()
+        while synthesis.running:
+            await asyncio.sleep(0.05)
+        return status, metrics
+
+    status, metrics = run_service(scenario)
+    assert status == 504
+    assert metrics["running"] == 1
+
+
+def test_client_disconnecting_cancels_the_request():
+    async def scenario(port, synthesis):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        data = json.dumps(SLOW_JOB).encode()
+        writer.write(b"POST /solve HTTP/1.1\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+                     % len(data) + data)
+        await writer.drain()
+        await asyncio.sleep(0.2)
+        writer.close()
+        while synthesis.counters["cancelled"] == 0:
+            await asyncio.sleep(0.05)
+        while synthesis.running:
+            await asyncio.sleep(0.05)
+        return synthesis.counters["499"]
+
+    assert run_service(scenario) == 1
+
+
+def test_unsafe_jobs_are_refused(tmp_path):
+    marker = tmp_path / "injected"
+    outside = tmp_path / "outside.csv"
+    outside.write_text("1,1\n2,4\n")
+    (tmp_path / "tables").mkdir()
+
+    async def scenario(port, synthesis):
+        return [await request(port, "POST", "/solve", {"func": "x**2"}, content_type=None),
+                await request(port, "POST", "/solve", {"func": "x**2"}, content_type="text/plain"),
+                await request(port, "POST", "/solve", {"func": "__import__('os').mkdir(%r) or x" % str(marker)}),
+                await request(port, "POST", "/solve", {"func": "Integral(x, x)"}),
+                await request(port, "POST", "/solve", {"func": "x**2", "checkpoint": str(tmp_path / "sweep")}),
+                await request(port, "POST", "/solve", {"table": "../outside.csv", "x_min": 1, "x_max": 2}),
+                await request(port, "POST", "/solve", {"table": str(outside), "x_min": 1, "x_max": 2})]
+
+    statuses = [status for status, _ in run_service(scenario, table_dir=str(tmp_path / "tables"))]
+    assert statuses == [415, 415, 400, 400, 400, 400, 400]
+    assert not marker.exists()
+    assert not (tmp_path / "sweep").exists()
+
+
+def test_tables_are_read_from_the_table_directory(tmp_path):
+    (tmp_path / "squares.csv").write_text("x,y\n" + "".join("%g,%g\n" % (x / 10, (x / 10)**2) for x in range(5, 21)))
+
+    async def scenario(port, synthesis):
+        return await request(port, "POST", "/solve", {"table": "squares.csv", "x_min": 0.5, "x_max": 2})
+
+    status, result = run_service(scenario, table_dir=str(tmp_path))
+    assert status == 200
+    assert result["found"]
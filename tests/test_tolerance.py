@@ -0,0 +1,55 @@
+import math
+
+import numpy as np
+import pytest
+
+import main
+import tolerance
+
+LOG10 = dict(func="log(x)/log(10)", x_min=1, x_max=2,
+             theta2_start=math.radians(100), theta2_max_rot=math.radians(120),
+             theta4_start=math.radians(240), theta4_max_rot=math.radians(60))
+
+
+@pytest.fixture(scope="module")
+def solver():
+    solver = main.Solver(**LOG10, do_optimise=True, sweep="grid", sweep_step=5)
+    solver.minimum_range = 0
+    solver.find_optimal_linkage()
+    return solver
+
+
+def arguments(solver):
+    samples = solver.target_samples()
+    return (solver.lengths, solver.theta2_start, solver.theta4_start, solver.theta2_max_rot,
+            solver.theta4_max_rot, samples["x_fractions"], samples["y_fractions"])
+
+
+def test_same_seed_gives_the_same_errors_for_any_chunks_and_workers(solver):
+    runs = [tolerance.monte_carlo(*arguments(solver), samples=20000, seed=7, keep_errors=True, **options)
+            for options in (dict(), dict(chunk_size=4096 * 101), dict(workers=2), dict(workers=3, chunk_size=1))]
+    for run in runs[1:]:
+        assert np.array_equal(run["errors"], runs[0]["errors"])
+        assert run["percentiles"] == runs[0]["percentiles"]
+
+    other = tolerance.monte_carlo(*arguments(solver), samples=20000, seed=8, keep_errors=True)
+    assert not np.array_equal(other["errors"], runs[0]["errors"])
+
+
+def test_no_tolerance_reproduces_the_nominal_error(solver):
+    report = tolerance.monte_carlo(*arguments(solver), samples=100, length_tolerance=0, angle_tolerance=0)
+    assert report["failure_rate"] == 0
+    assert report["percentiles"]["100"] == pytest.approx(report["nominal_error"])
+
+
+def test_report_is_in_units_of_y(solver):
+    report = solver.tolerance_analysis(samples=5000, distribution="uniform")
+    assert report["nominal_error"] == pytest.approx(solver.structural_error()["max"], rel=1e-6)
+    assert 0 <= report["failure_rate"] < 1
+    percentiles = [report["percentiles"][p] for p in ("50", "90", "95", "99", "100")]
+    assert percentiles == sorted(percentiles)
+
+
+def test_unknown_distribution_is_refused(solver):
+    with pytest.raises(ValueError):
+        tolerance.monte_carlo(*arguments(solver), samples=10, distribution="triangular")
@@ -0,0 +1,129 @@
+import math
+
+import numpy as np
+
+import engine
+
+#####################################################
+##           Monte Carlo Tolerance Analysis        ##
+#####################################################
+# Estimates how manufacturing tolerances spread the output of a synthesised linkage, by perturbing its
+# link lengths and pivot angles at random and measuring the structural error of every perturbed linkage
+#   report = tolerance.analyse(solver, samples=10**6, length_tolerance=0.005, workers=4)
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99, 100)
+
+
+# Max structural error (radians of output angle) of count perturbed linkages, and whether each assembles
+# over the whole input range. Perturbations are drawn from a generator seeded with seed, so every chunk
+# gives the same result whichever process runs it
+def perturbed_errors(seed, count, lengths, theta2_start, theta4_start, theta2_max_rot, theta4_max_rot,
+                     x_fractions, y_fractions, length_tolerance, angle_tolerance, distribution, branch):
+    rng = np.random.default_rng(seed)
+    if distribution == "normal":
+        draw = rng.standard_normal
+    else:
+        draw = lambda size: rng.uniform(-1.0, 1.0, size)
+
+    r1, r2, r3, r4 = (np.asarray(lengths, dtype=float) + length_tolerance * draw((count, 4))).T[..., None]
+    crank = angle_tolerance * draw(count)[:, None]       # error in mounting the input link on its pivot
+    ground = angle_tolerance * draw(count)[:, None]      # tilt of the line through the ground pivots
+
+    # the same construction as kinematics.output_angles, but with unit complex numbers in place of
+    # angles so every sample only needs one angle worked out, which is about twice as fast
+    # angles are measured from the intended ground line, while the linkage works relative to the tilted one
+    theta2 = theta2_start + theta2_max_rot * np.asarray(x_fractions)
+    diagonal = r2 * (np.exp(1j*theta2) * np.exp(1j*(crank - ground))) - r1     # from D to B
+    length = np.abs(diagonal)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_angle = (r4**2 - r3**2 + length**2) / (2*r4*length)
+    assembled = np.abs(cos_angle) <= 1
+    sin_angle = np.sqrt(np.maximum(1 - cos_angle**2, 0))
+
+    # e^(i theta4) is -diagonal/length turned through -branch*angle, compared to the target output angle
+    target = theta4_start + theta4_max_rot * np.asarray(y_fractions)
+    relative = diagonal * (cos_angle - 1j*branch*sin_angle)
+    relative *= np.exp(1j*ground) * -np.exp(-1j*target)
+    error = np.where(assembled, np.abs(np.angle(relative)), np.inf)
+
+    assembled = np.all(assembled, axis=-1)
+    return np.max(error, axis=-1), assembled
+
+
+# Assembly branch (1 or -1) the nominal linkage follows the target on, and its max structural error
+def nominal_branch(lengths, theta2_start, theta4_start, theta2_max_rot, theta4_max_rot, x_fractions, y_fractions):
+    errors = {}
+    for branch in (1, -1):
+        errors[branch], _ = perturbed_errors(0, 1, lengths, theta2_start, theta4_start, theta2_max_rot,
+                                             theta4_max_rot, x_fractions, y_fractions, 0.0, 0.0, "normal", branch)
+    branch = min(errors, key=lambda branch: errors[branch][0])
+    return branch, float(errors[branch][0])
+
+
+# Runs samples perturbed linkages in chunks of chunk_size, in a pool of worker processes if workers > 1
+# Lengths are perturbed by length_tolerance and the crank and ground pivot angles by angle_tolerance
+# (radians), which are standard deviations for a "normal" distribution and bounds for a "uniform" one
+# The same seed gives the same result for any chunk_size and number of workers
+# Returns a report of the nominal error, the percentiles of the max error of the linkages that assemble,
+# their mean, and the fraction that cannot be assembled over the whole input range, errors being in
+# radians of output angle. keep_errors adds every sample's max error (inf if it failed) to the report
+def monte_carlo(lengths, theta2_start, theta4_start, theta2_max_rot, theta4_max_rot, x_fractions, y_fractions,
+                samples=100000, length_tolerance=0.01, angle_tolerance=math.radians(0.5), distribution="normal",
+                seed=0, chunk_size=None, workers=1, percentiles=DEFAULT_PERCENTILES, keep_errors=False) -> dict:
+    if distribution not in ("normal", "uniform"):
+        raise ValueError("distribution must be either 'normal' or 'uniform', not %r" % (distribution,))
+
+    geometry = (theta2_start, theta4_start, theta2_max_rot, theta4_max_rot, x_fractions, y_fractions)
+    branch, nominal_error = nominal_branch(lengths, *geometry)
+
+    # the chunks are fixed by the seed and sample count alone, so chunk_size only groups them into work
+    chunk = 4096
+    seeds = np.random.SeedSequence(seed).spawn(math.ceil(samples / chunk))
+    counts = [min(chunk, samples - i * chunk) for i in range(len(seeds))]
+    per_task = max(1, (chunk_size or engine.GRID_BLOCK_SIZE // len(x_fractions)) // chunk)
+    tasks = [(seeds[i:i + per_task], counts[i:i + per_task]) for i in range(0, len(seeds), per_task)]
+    arguments = (lengths, *geometry, length_tolerance, angle_tolerance, distribution, branch)
+
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_task, tasks, [arguments] * len(tasks)))
+    else:
+        results = [_run_task(task, arguments) for task in tasks]
+
+    errors = np.concatenate([errors for errors, _ in results])
+    assembled = np.concatenate([assembled for _, assembled in results])
+    working = errors[assembled]
+
+    report = {"samples": samples, "branch": branch, "nominal_error": nominal_error,
+              "failure_rate": float(1 - np.mean(assembled)) if samples else 0.0,
+              "mean_error": float(np.mean(working)) if len(working) else math.nan,
+              "percentiles": {str(p): (float(np.percentile(working, p)) if len(working) else math.nan)
+                              for p in percentiles}}
+    if keep_errors:
+        report["errors"] = errors
+    return report
+
+
+def _run_task(task, arguments):
+    seeds, counts = task
+    results = [perturbed_errors(seed, count, *arguments) for seed, count in zip(seeds, counts)]
+    return (np.concatenate([errors for errors, _ in results]),
+            np.concatenate([assembled for _, assembled in results]))
+
+
+# monte_carlo for the linkage a main.Solver has found, sampled at its error_samples values of x
+# The errors in the report are converted into units of y, like Solver.structural_error
+def analyse(solver, **kwargs) -> dict:
+    samples = solver.target_samples()
+    report = monte_carlo(solver.lengths, solver.theta2_start, solver.theta4_start,
+                         solver.theta2_max_rot, solver.theta4_max_rot,
+                         samples["x_fractions"], samples["y_fractions"], **kwargs)
+
+    scale = samples["y_per_radian"]
+    report["nominal_error"] *= scale
+    report["mean_error"] *= scale
+    report["percentiles"] = {p: error * scale for p, error in report["percentiles"].items()}
+    if "errors" in report:
+        report["errors"] = report["errors"] * scale
+    return report